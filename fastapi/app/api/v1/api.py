@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import rooms, qa, chat # Import chat
+from app.api.v1.endpoints import rooms, qa, chat, ingest_jobs # Import chat
 
 router = APIRouter()
 router.include_router(rooms.router, tags=["rooms"])
 router.include_router(qa.router, tags=["QA"])
-router.include_router(chat.router, tags=["chat"]) # Include chat router
\ No newline at end of file
+router.include_router(chat.router, tags=["chat"]) # Include chat router
+router.include_router(ingest_jobs.router, tags=["ingest"])
@@ -1,16 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from typing import List, Optional
 from app.schemas.chat import ChatMessage
-from app.services.chat_service import get_chat_messages
+from app.services.chat_service import get_chat_messages_page
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.core.dependencies import get_mongo_db
 
 router = APIRouter()
 
+def _encode_message(room_id: int, message: dict) -> str:
+    # Documents are written by chat_service, so they are encoded directly instead of
+    # being validated through ChatMessage; the output matches ChatMessage's JSON form.
+    return json.dumps({
+        "_id": str(message["_id"]),
+        "room_id": room_id,
+        "sequence_number": message["sequence_number"],
+        "sender": message["sender"],
+        "content": message["content"],
+        "timestamp": message["timestamp"].isoformat(),
+    }, ensure_ascii=False)
+
 @router.get("/rooms/{room_id}/messages", response_model=List[ChatMessage])
 async def read_chat_messages(
     room_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = Query(None, description="Only messages with a smaller sequence_number"),
+    after: Optional[int] = Query(None, description="Only messages with a larger sequence_number"),
     db: AsyncIOMotorDatabase = Depends(get_mongo_db)
 ):
-    messages = await get_chat_messages(db, room_id)
-    return messages
+    """
+    Returns one page of a room's messages in ascending sequence_number order: the most recent
+    `limit` by default. Pass the first message's sequence_number as `before` to load older pages.
+    """
+    # The page (at most 200 messages) is read before responding, so a MongoDB error becomes a
+    # 500 instead of a truncated 200 body.
+    try:
+        page = await get_chat_messages_page(db, room_id, limit, before=before, after=after)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred while reading messages: {str(e)}")
+    body = "[" + ",".join(_encode_message(room_id, message) for message in page) + "]"
+    return Response(content=body, media_type="application/json")
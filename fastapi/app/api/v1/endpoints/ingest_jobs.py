@@ -0,0 +1,98 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.init_db import get_db, Room, IngestionManifest
+from app.schemas.qa import IngestJobStatus, UpsertResponse
+from app.services import ingest_service, manifest_service, pdf_service
+
+router = APIRouter()
+
+_MANIFEST_STAGES = {"pending": "queued", "ingesting": "embedding"}
+
+def _status_from_manifest(job_id: str, manifest: IngestionManifest) -> IngestJobStatus:
+    # Per-chunk counters live with the job; the manifest only knows its committed batches.
+    chunk_count = manifest.chunk_count or 0
+    if manifest.status == "completed":
+        done = chunk_count
+    else:
+        done = min(manifest.batches_committed * manifest.batch_size, chunk_count)
+
+    stage = _MANIFEST_STAGES.get(manifest.status, manifest.status)
+    error = manifest.error
+    if manifest.status in ("pending", "ingesting") and not manifest_service.is_ingestion_live(manifest):
+        # Its worker stopped without recording the outcome (crash or restart).
+        stage = "failed"
+        error = f"Ingestion was interrupted. Resume it with POST /rooms/{manifest.room_id}/ingest."
+    return IngestJobStatus(
+        job_id=job_id,
+        room_id=manifest.room_id,
+        stage=stage,
+        chunk_count=chunk_count,
+        chunks_embedded=done,
+        chunks_upserted=done,
+        error=error
+    )
+
+@router.get("/ingest-jobs/{job_id}", response_model=IngestJobStatus)
+async def read_ingest_job(job_id: str, db_mysql: AsyncSession = Depends(get_db)):
+    """
+    인제스트 작업의 진행 상황을 반환합니다. 작업이 다른 워커에서 실행 중이거나 서버가 재시작된 경우에는
+    MySQL의 인제스트 매니페스트에 기록된 상태를 반환합니다.
+    """
+    job = ingest_service.get_job(job_id)
+    if job is None:
+        manifest = await manifest_service.get_manifest_by_job_id(db_mysql, job_id)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Ingest job not found")
+        return _status_from_manifest(job_id, manifest)
+    return IngestJobStatus(
+        job_id=job.job_id,
+        room_id=job.room_id,
+        stage=job.stage,
+        chunk_count=job.progress.chunk_count,
+        chunks_embedded=job.progress.chunks_embedded,
+        chunks_upserted=job.progress.chunks_upserted,
+        error=job.error
+    )
+
+@router.post("/rooms/{room_id}/ingest", response_model=UpsertResponse, status_code=status.HTTP_202_ACCEPTED)
+async def retry_room_ingest(
+    room_id: int,
+    db_mysql: AsyncSession = Depends(get_db)
+):
+    """
+    Restarts ingestion for a room whose previous run failed or was interrupted. Batches already
+    recorded in the room's ingestion manifest are not embedded or upserted again.
+    """
+    room = await db_mysql.get(Room, room_id)
+    manifest = await manifest_service.get_manifest(db_mysql, room_id)
+    if room is None or manifest is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if manifest.status == "completed":
+        raise HTTPException(status_code=409, detail="This room's PDF is already ingested.")
+    if ingest_service.is_room_ingesting(room_id) or manifest_service.is_ingestion_live(manifest):
+        raise HTTPException(status_code=409, detail="This room's PDF is already being ingested.")
+
+    # Rooms created before uploads got unique file names may point at a file another upload has
+    # since replaced; ingesting it would store the wrong text under this room's content hash.
+    try:
+        file_hash = await run_in_threadpool(pdf_service.file_sha256, room.file_path)
+    except FileNotFoundError:
+        file_hash = None
+    if file_hash != manifest.content_hash:
+        raise HTTPException(status_code=409, detail="This room's PDF file is missing or was replaced. Please upload it again.")
+
+    job = ingest_service.create_job(size_bytes=os.path.getsize(room.file_path))
+    try:
+        await manifest_service.mark_pending(db_mysql, manifest, job.job_id)
+    except Exception:
+        ingest_service.discard_job(job)
+        raise
+    ingest_service.start_job(job, room_id=room_id, file_location=room.file_path, content_hash=manifest.content_hash)
+    return {
+        "message": f"Resuming ingestion after {manifest.batches_committed} committed batches.",
+        "base_id": str(room_id),
+        "job_id": job.job_id
+    }
@@ -1,12 +1,20 @@
 import os
-import shutil
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+import json
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase # Import for MongoDB dependency
 from sqlalchemy.ext.asyncio import AsyncSession # Import for SQLAlchemy session
 
-from app.services import pdf_service, vector_service, chat_service # Import chat_service
-from app.schemas.qa import UpsertResponse, QueryResponse
+from app.services import pdf_service, vector_service, chat_service, answer_cache, ingest_service, manifest_service, room_service # Import chat_service
+from app.schemas.qa import (
+    UpsertResponse, QueryResponse, AnswerCacheStats,
+    BatchQueryRequest, BatchQueryItem, BatchQueryResponse
+)
 from app.core.dependencies import get_mongo_db # Import get_mongo_db
+from app.core.config import MAX_UPLOAD_BYTES
 from app.db.init_db import get_db, Room # Import MySQL dependencies
 
 router = APIRouter()
@@ -14,7 +22,7 @@ router = APIRouter()
 UPLOAD_DIR = "uploaded_pdfs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/upsert-pdf/", response_model=UpsertResponse)
+@router.post("/upsert-pdf/", response_model=UpsertResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upsert_pdf(
     title: str = Form(...),
     file: UploadFile = File(...),
@@ -22,42 +30,53 @@ async def upsert_pdf(
     db_mysql: AsyncSession = Depends(get_db) # MySQL DB session
 ):
     """
-    PDF 파일에서 직접 텍스트를 추출하고, 조각으로 나눈 후 임베딩하여 Pinecone에 저장합니다.
-    추출된 텍스트는 파일로 캐싱하여 재사용합니다.
+    PDF 파일을 저장하고 방(room)을 만든 뒤, 텍스트 추출/임베딩/Pinecone 저장은 백그라운드 작업으로 실행합니다.
+    진행 상황은 반환된 job_id로 GET /ingest-jobs/{job_id} 에서 확인할 수 있습니다.
     """
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a PDF.")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise pdf_service.upload_too_large()
 
+    # Admission control: reject before writing anything if the ingest queue is full.
+    job = ingest_service.create_job(size_bytes=file.size or 0)
+    file_location = None
     try:
-        # 1. Save PDF file
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 1. Save PDF file in one streaming pass off the event loop, hashing its bytes as they are written.
+        # Every upload gets its own file: ingestion reads it after this request returns, and a later
+        # upload with the same name must not replace it in the meantime.
+        file_location = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}-{pdf_service.safe_filename(file.filename)}")
+        content_hash = await run_in_threadpool(pdf_service.save_upload, file, file_location)
 
-        # 2. Insert into rooms table
+        # 2. Insert into rooms table, together with the room's ingestion manifest
         new_room = Room(user_id=user_id, title=title, file_path=file_location)
         db_mysql.add(new_room)
+        await db_mysql.flush()
+        db_mysql.add(manifest_service.new_manifest(new_room.id, content_hash, job_id=job.job_id))
         await db_mysql.commit()
         await db_mysql.refresh(new_room)
         room_id = new_room.id
-
-        # 3. Process PDF text and upsert to Pinecone
-        await file.seek(0)
-        text = await pdf_service.get_text_from_pdf(title, file) # title is still used for PDF processing
-        # Use room_id as the base_id for Pinecone
-        chunk_count = vector_service.upsert_text_to_pinecone(room_id=str(room_id), text=text)
-
-        return {
-            "message": f"Successfully split into {chunk_count} chunks, embedded, and stored!",
-            "base_id": str(room_id), # Return room_id as base_id
-            "chunk_count": chunk_count
-        }
+        room_service.invalidate_user_rooms(user_id)
     except HTTPException as http_exc:
+        ingest_service.discard_job(job)
+        await run_in_threadpool(pdf_service.delete_pdf_files, file_location, None)
         raise http_exc
     except Exception as e:
+        ingest_service.discard_job(job)
         await db_mysql.rollback() # Rollback in case of error
+        # No room points at the saved PDF, so nothing would ever delete it.
+        await run_in_threadpool(pdf_service.delete_pdf_files, file_location, None)
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+    # 3. Extract text and upsert to Pinecone in the background
+    ingest_service.start_job(job, room_id=room_id, file_location=file_location, content_hash=content_hash)
+
+    return {
+        "message": "PDF saved. Text extraction and embedding are running in the background.",
+        "base_id": str(room_id), # Return room_id as base_id
+        "job_id": job.job_id
+    }
+
 @router.post("/query-pdf/", response_model=QueryResponse)
 async def query_pdf(
     room_id: int = Form(...),
@@ -68,23 +87,95 @@ async def query_pdf(
     특정 PDF(room_id)에 대해 질문(question)하고 Gemini를 통해 답변을 받습니다.
     """
     try:
-        # Save user's question to MongoDB
-        await chat_service.create_chat_message(
-            db=db,
-            room_id=room_id,
-            sender="user",
-            content=question
-        )
+        answer = await vector_service.aquery_from_pinecone(room_id=str(room_id), question=question)
 
-        answer = vector_service.query_from_pinecone(room_id=str(room_id), question=question)
-
-        await chat_service.create_chat_message(
+        # Save the question and answer to MongoDB together
+        await chat_service.create_chat_messages(
             db=db,
             room_id=room_id,
-            sender="system",
-            content=answer
+            messages=[("user", question), ("system", answer)]
         )
 
         return {"answer": answer, "source_document_id": str(room_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred during query: {str(e)}")
+
+@router.post("/query-pdf/batch", response_model=BatchQueryResponse)
+async def query_pdf_batch(
+    request: BatchQueryRequest,
+    db: AsyncIOMotorDatabase = Depends(get_mongo_db)
+):
+    """
+    한 방(room_id)에 대한 여러 질문을 한 번에 처리합니다. 질문 임베딩은 한 번의 호출로 만들고,
+    검색과 답변 생성은 동시에 실행합니다. 결과는 질문 순서대로 반환되며, 실패한 질문은 error에 사유가 담깁니다.
+    성공한 질문과 답변은 한 번의 쓰기로 채팅 기록에 저장됩니다.
+    """
+    try:
+        answers = await vector_service.aquery_batch_from_pinecone(
+            room_id=str(request.room_id), questions=request.questions
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred during query: {str(e)}")
+
+    results = []
+    messages = []
+    for question, answer in zip(request.questions, answers):
+        if isinstance(answer, BaseException):
+            results.append(BatchQueryItem(question=question, error=str(answer)))
+        else:
+            results.append(BatchQueryItem(question=question, answer=answer))
+            messages += [("user", question), ("system", answer)]
+
+    if messages:
+        try:
+            await chat_service.create_chat_messages(db=db, room_id=request.room_id, messages=messages)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"An error occurred while saving the chat history: {str(e)}")
+
+    return {"source_document_id": str(request.room_id), "results": results}
+
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+@router.post("/query-pdf/stream")
+async def query_pdf_stream(
+    room_id: int = Form(...),
+    question: str = Form(...),
+    db: AsyncIOMotorDatabase = Depends(get_mongo_db)
+):
+    """
+    /query-pdf/ 의 스트리밍 버전입니다. 답변 토큰을 생성되는 즉시 Server-Sent Events로 전송하고,
+    스트림이 끝나면 질문과 전체 답변을 채팅 기록에 저장한 뒤 `done` 이벤트를 보냅니다.
+    """
+    async def event_stream():
+        parts = []
+        try:
+            async for token in vector_service.astream_query_from_pinecone(room_id=str(room_id), question=question):
+                parts.append(token)
+                yield _sse_event({"token": token})
+
+            answer = "".join(parts)
+            await chat_service.create_chat_messages(
+                db=db,
+                room_id=room_id,
+                messages=[("user", question), ("system", answer)]
+            )
+        except Exception as e:
+            yield _sse_event({"detail": f"An error occurred during query: {str(e)}"}, event="error")
+            return
+
+        yield _sse_event({"answer": answer, "source_document_id": str(room_id)}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/answer-cache/stats", response_model=AnswerCacheStats)
+async def read_answer_cache_stats():
+    """
+    답변 캐시의 hit/miss 카운터를 반환합니다. 유사도 임계값 튜닝에 사용합니다.
+    """
+    return answer_cache.get_stats()
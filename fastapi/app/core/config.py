@@ -11,18 +11,102 @@ PINECONE_INDEX_NAME = "card"
 # Upstage
 UPSTAGE_API_KEY = os.getenv("UPSTAGE_API_KEY")
 
+EMBEDDING_MODEL = "solar-embedding-1-large"
+
 # Gemini
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 # Vector DB
-EMBEDDING_DIMENSION = 4096
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "4096"))
+# "pinecone", or "local" for the in-process index stored under LOCAL_VECTOR_DIR (offline/dev/benchmarks).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", "vector_index")
 
 # Text Splitter
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 
+# Ingestion pipeline
+# Chunks per embedding request (Upstage accepts at most 100).
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))
+# Pinecone upserts are split by estimated request size: Pinecone rejects requests over 2 MB or 1000 vectors.
+PINECONE_UPSERT_MAX_BYTES = int(os.getenv("PINECONE_UPSERT_MAX_BYTES", str(2 * 1024 * 1024 - 64 * 1024)))
+PINECONE_UPSERT_MAX_VECTORS = int(os.getenv("PINECONE_UPSERT_MAX_VECTORS", "1000"))
+# Rooms live in their own Pinecone namespace. Until `python -m scripts.migrate_pinecone_namespaces`
+# has moved vectors stored before that out of the default namespace, queries for a room with an empty
+# namespace fall back to the old room_id filter, and room deletes also clear its old vectors.
+PINECONE_LEGACY_FILTER_FALLBACK = os.getenv("PINECONE_LEGACY_FILTER_FALLBACK", "true").lower() == "true"
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+# Max batches waiting between stages; bounds how many vectors are held in memory at once.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+# Background ingestion jobs
+INGEST_MAX_RUNNING_JOBS = int(os.getenv("INGEST_MAX_RUNNING_JOBS", "2"))
+# Admission control: uploads are rejected with 503 once this many jobs / bytes are queued or running.
+INGEST_MAX_PENDING_JOBS = int(os.getenv("INGEST_MAX_PENDING_JOBS", "16"))
+INGEST_MAX_PENDING_BYTES = int(os.getenv("INGEST_MAX_PENDING_BYTES", str(512 * 1024 * 1024)))
+# Finished jobs stay queryable for this long.
+INGEST_JOB_RETENTION_SECONDS = int(os.getenv("INGEST_JOB_RETENTION_SECONDS", "3600"))
+# An ingesting manifest not updated for this long belongs to a job whose worker died.
+# Running jobs update it after every committed batch.
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "600"))
+
+# Room deletion reaper
+ROOM_REAPER_INTERVAL_SECONDS = int(os.getenv("ROOM_REAPER_INTERVAL_SECONDS", "30"))
+ROOM_REAPER_BATCH_SIZE = int(os.getenv("ROOM_REAPER_BATCH_SIZE", "20"))
+# Retry delay grows per failed attempt up to this cap.
+ROOM_REAPER_MAX_BACKOFF_SECONDS = int(os.getenv("ROOM_REAPER_MAX_BACKOFF_SECONDS", "3600"))
+
+# Uploads
+# Larger PDFs are rejected with 413; the upload is streamed to disk, so this bounds disk use, not memory.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+# PDF extraction
+# PDFs with at least PDF_EXTRACT_PARALLEL_MIN_PAGES pages are extracted in a process pool of
+# PDF_EXTRACT_WORKERS processes (shared by all uploads), PDF_EXTRACT_PAGES_PER_TASK pages per task.
+# Smaller PDFs, or PDF_EXTRACT_WORKERS=1, are extracted inline.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv("PDF_EXTRACT_PARALLEL_MIN_PAGES", "64"))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "16"))
+
 # Cache
+# Extracted text is cached per PDF content hash (gzip-compressed, LRU-evicted past the byte cap).
 TEXT_CACHE_DIR = "text_cache"
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Optional store of chunk embeddings per PDF content hash; unset disables re-embedding reuse.
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Query
+# Max number of in-flight queries (embed -> search -> LLM); extra requests wait for a slot.
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "8"))
+RETRIEVAL_TOP_K = 4
+# POST /query-pdf/batch: max questions per request, and how many of them are answered at once
+# (each also takes one of the QUERY_CONCURRENCY slots).
+BATCH_QUERY_MAX_QUESTIONS = int(os.getenv("BATCH_QUERY_MAX_QUESTIONS", "50"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "4"))
+# Retrieved chunks are packed into the prompt up to this many tokens, estimated as
+# characters / CONTEXT_CHARS_PER_TOKEN (roughly 4 for English; lower it for Korean-heavy PDFs).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+
+# Embedding micro-batcher: query and chunk embeddings from all requests are sent together,
+# up to EMBED_BATCH_MAX_SIZE texts per call (Upstage allows 100), waiting at most
+# EMBED_BATCH_MAX_WAIT_MS for a call to fill, with EMBED_BATCH_CONCURRENCY calls in flight.
+EMBED_BATCHER_ENABLED = os.getenv("EMBED_BATCHER_ENABLED", "true").lower() == "true"
+EMBED_BATCH_MAX_SIZE = min(int(os.getenv("EMBED_BATCH_MAX_SIZE", "64")), 100)
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "8"))
+# Send waiting question embeddings before waiting ingest chunks.
+EMBED_BATCH_PRIORITIZE_QUERIES = os.getenv("EMBED_BATCH_PRIORITIZE_QUERIES", "true").lower() == "true"
+
+# Answer cache (per room, matched by question-embedding cosine similarity)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 # MongoDB
 MONGODB_URI = os.getenv("MONGODB_URI")
@@ -34,6 +118,31 @@ MYSQL_HOST = os.getenv("MYSQL_HOST")
 MYSQL_USER = os.getenv("MYSQL_USER")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
 MYSQL_DB = os.getenv("MYSQL_DB")
+# Full SQLAlchemy URL overriding the MYSQL_* settings (e.g. sqlite+aiosqlite:///bench.db for offline runs).
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Connection pool: persistent connections, extra burst connections, and max connection age
+# (kept below MySQL's wait_timeout so the server never drops a pooled connection first).
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "10"))
+MYSQL_MAX_OVERFLOW = int(os.getenv("MYSQL_MAX_OVERFLOW", "20"))
+MYSQL_POOL_RECYCLE_SECONDS = int(os.getenv("MYSQL_POOL_RECYCLE_SECONDS", "1800"))
+MYSQL_POOL_TIMEOUT_SECONDS = int(os.getenv("MYSQL_POOL_TIMEOUT_SECONDS", "30"))
+
+# Per-user room list cache (sidebar). Invalidated on room creation/deletion in this process;
+# the TTL bounds staleness when several workers serve the same user.
+ROOM_LIST_CACHE_TTL_SECONDS = int(os.getenv("ROOM_LIST_CACHE_TTL_SECONDS", "60"))
+ROOM_LIST_CACHE_MAX_ENTRIES = int(os.getenv("ROOM_LIST_CACHE_MAX_ENTRIES", "10000"))
+
+# MySQL engine
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+# Startup
+# "auto" runs table/index creation only when the schema changed since the last boot (tracked in
+# SCHEMA_MARKER_PATH), "always" runs it on every boot, "never" skips it.
+DB_SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "auto")
+SCHEMA_MARKER_PATH = os.getenv("SCHEMA_MARKER_PATH", ".schema_ready")
+# How clients (vector backend, embeddings, LLM) are created: "background" warms them up after the app
+# starts serving, "blocking" before it does, "off" leaves them to the first request that needs them.
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
 
 # Server
 API_V1_STR = "/api/v1"
\ No newline at end of file
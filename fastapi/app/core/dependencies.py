@@ -1,68 +1,176 @@
-from pinecone import Pinecone, ServerlessSpec
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_upstage import UpstageEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import functools
+import numpy as np
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase # Import motor
+from pymongo import monitoring
 
+from app.core.resources import resources
+from app.core.metrics import MONGO_COMMAND_SECONDS
+from app.core.request_context import log
 from app.core.config import (
     PINECONE_API_KEY, PINECONE_ENVIRONMENT, PINECONE_INDEX_NAME,
-    UPSTAGE_API_KEY, GEMINI_API_KEY, EMBEDDING_DIMENSION,
-    CHUNK_SIZE, CHUNK_OVERLAP,
+    UPSTAGE_API_KEY, EMBEDDING_MODEL, GEMINI_API_KEY, EMBEDDING_DIMENSION,
+    VECTOR_BACKEND, LOCAL_VECTOR_DIR,
+    CHUNK_SIZE, CHUNK_OVERLAP, INGEST_EMBED_BATCH_SIZE,
+    PINECONE_UPSERT_MAX_BYTES, PINECONE_UPSERT_MAX_VECTORS, PINECONE_LEGACY_FILTER_FALLBACK,
+    EMBED_BATCHER_ENABLED, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, EMBED_BATCH_CONCURRENCY, EMBED_BATCH_PRIORITIZE_QUERIES,
     MONGODB_URI, DB_NAME # Import MongoDB config
 )
 
-# Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Client libraries are imported inside the factories: they are slow to import, and a
+# process that never touches e.g. Pinecone (local vector backend) shouldn't pay for them.
 
-# Upstage Embeddings
-embeddings = UpstageEmbeddings(api_key=UPSTAGE_API_KEY, model="solar-embedding-1-large")
+def _create_pinecone_client():
+    from pinecone import Pinecone
+    return Pinecone(api_key=PINECONE_API_KEY)
 
-# Gemini LLM
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GEMINI_API_KEY)
+def _create_pinecone_index():
+    from pinecone import ServerlessSpec
+    pc = resources.get("pinecone_client")
+    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
+        log(f"Creating a new Pinecone index: {PINECONE_INDEX_NAME} with dimension {EMBEDDING_DIMENSION}")
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=EMBEDDING_DIMENSION,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud="aws",
+                region=PINECONE_ENVIRONMENT
+            )
+        )
+    return pc.Index(PINECONE_INDEX_NAME)
 
-# Text Splitter
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=CHUNK_SIZE,
-    chunk_overlap=CHUNK_OVERLAP
-)
+def _create_vector_backend():
+    from app.services.vector_backends import PineconeVectorBackend, LocalVectorBackend
+    if VECTOR_BACKEND == "local":
+        return LocalVectorBackend(LOCAL_VECTOR_DIR, EMBEDDING_DIMENSION)
+    if VECTOR_BACKEND == "pinecone":
+        return PineconeVectorBackend(
+            resources.get("pinecone_index"), EMBEDDING_DIMENSION,
+            max_request_bytes=PINECONE_UPSERT_MAX_BYTES,
+            max_request_vectors=PINECONE_UPSERT_MAX_VECTORS,
+            legacy_filter_fallback=PINECONE_LEGACY_FILTER_FALLBACK
+        )
+    raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+def _create_embeddings():
+    from app.core.upstage import BatchQueryUpstageEmbeddings
+    return BatchQueryUpstageEmbeddings(
+        api_key=UPSTAGE_API_KEY,
+        model=EMBEDDING_MODEL,
+        # One API call per ingest batch or micro-batcher batch.
+        embed_batch_size=min(max(INGEST_EMBED_BATCH_SIZE, EMBED_BATCH_MAX_SIZE), 100)
+    )
+
+def _embed_with_client(kind: str, texts: list[str]) -> list:
+    # Looked up per call, so an overridden embeddings client is picked up by the batcher too.
+    embeddings = resources.get("embeddings")
+    if kind == "passage":
+        return embeddings.embed_documents(texts)
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+def _create_embedding_batcher():
+    from app.services.embedding_batcher import EmbeddingBatcher, QUERY, PASSAGE
+    return EmbeddingBatcher(
+        {kind: functools.partial(_embed_with_client, kind) for kind in (QUERY, PASSAGE)},
+        max_batch_size=EMBED_BATCH_MAX_SIZE,
+        max_wait=EMBED_BATCH_MAX_WAIT_MS / 1000,
+        concurrency=EMBED_BATCH_CONCURRENCY,
+        prioritize_queries=EMBED_BATCH_PRIORITIZE_QUERIES
+    )
+
+def _create_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GEMINI_API_KEY)
+
+def _create_text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
+
+def _create_qa_prompt():
+    # The default "stuff" QA prompt for our LLM, filled with {context} and {question} per query.
+    from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+    return PROMPT_SELECTOR.get_prompt(resources.get("llm"))
+
+resources.register("pinecone_client", _create_pinecone_client)
+resources.register("pinecone_index", _create_pinecone_index)
+resources.register("vector_backend", _create_vector_backend)
+resources.register("embeddings", _create_embeddings)
+resources.register("embedding_batcher", _create_embedding_batcher)
+resources.register("llm", _create_llm)
+resources.register("text_splitter", _create_text_splitter)
+resources.register("qa_prompt", _create_qa_prompt)
 
 # MongoDB Client
 _mongo_client: AsyncIOMotorClient = None
 
+class _MongoCommandTimer(monitoring.CommandListener):
+    """Exports the duration of every command the driver sends (find, insert, findAndModify, ...)."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
 async def get_mongo_db() -> AsyncIOMotorDatabase:
     global _mongo_client
     if _mongo_client is None:
-        print(f"Attempting to connect to MongoDB at {MONGODB_URI}")
-        _mongo_client = AsyncIOMotorClient(MONGODB_URI)
+        log(f"Attempting to connect to MongoDB at {MONGODB_URI}")
+        _mongo_client = AsyncIOMotorClient(MONGODB_URI, event_listeners=[_MongoCommandTimer()])
         try:
             # The ping command is cheap and does not require auth.
             await _mongo_client.admin.command('ping')
-            print("MongoDB connection successful!")
+            log("MongoDB connection successful!")
         except Exception as e:
-            print(f"MongoDB connection failed: {e}")
+            log(f"MongoDB connection failed: {e}")
             _mongo_client = None # Reset client if connection fails
             raise
     return _mongo_client[DB_NAME]
 
+def close_mongo_client():
+    global _mongo_client
+    if _mongo_client is not None:
+        _mongo_client.close()
+        _mongo_client = None
+
 def get_pinecone_index():
-    if PINECONE_INDEX_NAME not in pc.list_indexes().names():
-        print(f"Creating a new Pinecone index: {PINECONE_INDEX_NAME} with dimension {EMBEDDING_DIMENSION}")
-        pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=EMBEDDING_DIMENSION,
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud="aws",
-                region=PINECONE_ENVIRONMENT
-            )
-        )
-    return pc.Index(PINECONE_INDEX_NAME)
+    return resources.get("pinecone_index")
+
+def get_vector_backend():
+    """The vector store selected by VECTOR_BACKEND."""
+    return resources.get("vector_backend")
+
+def get_qa_prompt():
+    return resources.get("qa_prompt")
+
+def init_vector_resources():
+    """Builds the vector backend, embeddings, LLM and QA prompt up front so the first request doesn't pay for it."""
+    names = ["vector_backend", "embeddings", "llm", "text_splitter", "qa_prompt"]
+    resources.warmup(names)
 
 def get_embeddings():
-    return embeddings
+    return resources.get("embeddings")
+
+def embed_texts(kind: str, texts: list[str]) -> np.ndarray:
+    """
+    Embeds texts as "query" or "passage" vectors and returns them as a (len(texts), dimension)
+    float32 matrix. With EMBED_BATCHER_ENABLED, texts from concurrent callers are combined
+    into shared API calls. Blocking.
+    """
+    if EMBED_BATCHER_ENABLED:
+        return resources.get("embedding_batcher").embed(kind, texts)
+    return np.asarray(_embed_with_client(kind, texts), dtype=np.float32)
 
 def get_llm():
-    return llm
+    return resources.get("llm")
 
 def get_text_splitter():
-    return text_splitter
\ No newline at end of file
+    return resources.get("text_splitter")
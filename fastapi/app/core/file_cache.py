@@ -0,0 +1,30 @@
+import os
+
+def touch(path: str):
+    """Marks a cache file as recently used; eviction goes by modification time."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+def evict_lru(directory: str, max_bytes: int):
+    """Deletes least recently used files in a cache directory until it fits in max_bytes."""
+    files = []
+    total = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    files.sort()
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
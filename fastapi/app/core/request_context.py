@@ -0,0 +1,49 @@
+import time
+import uuid
+from contextvars import ContextVar
+
+from app.core.metrics import HTTP_REQUEST_SECONDS
+
+# Set per HTTP request; tasks and threadpool calls started from the request inherit it,
+# so background ingest jobs log under the id of the upload that started them.
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+REQUEST_ID_HEADER = "x-request-id"
+
+def log(message: str):
+    print(f"[{request_id_var.get()}] {message}")
+
+class RequestContextMiddleware:
+    """
+    Assigns each request an id (the client's X-Request-ID, or a new one), echoes it back in the
+    response headers, and records the request duration up to the end of the (possibly streamed) body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Label by route template (not the raw path) to keep the number of series bounded.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status)
+            request_id_var.reset(token)
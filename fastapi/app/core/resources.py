@@ -0,0 +1,43 @@
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from app.core.request_context import log
+
+class Resources:
+    """
+    Process-wide clients (Pinecone, embeddings, LLM, ...) built on first use instead of at
+    import time. Factories may depend on other resources through `get`. `warmup` builds
+    them eagerly, and `override` swaps in stand-ins (tests, benchmarks).
+    """
+
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._instances: dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.init_seconds: dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.init_seconds[name] = time.perf_counter() - started
+                log(f"Initialized {name} in {self.init_seconds[name]:.2f}s")
+            return self._instances[name]
+
+    def override(self, **instances: Any):
+        with self._lock:
+            self._instances.update(instances)
+
+    def warmup(self, names: Optional[Iterable[str]] = None):
+        for name in names if names is not None else list(self._factories):
+            self.get(name)
+
+resources = Resources()
@@ -0,0 +1,15 @@
+from langchain_upstage import UpstageEmbeddings
+from langchain_upstage.embeddings import MAX_EMBED_BATCH_SIZE
+
+class BatchQueryUpstageEmbeddings(UpstageEmbeddings):
+    """UpstageEmbeddings that can also embed several queries per API call."""
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        # Same as embed_query (the "-query" model), but the API accepts a list of inputs.
+        params = self._invocation_params
+        params["model"] = params["model"] + "-query"
+        embeddings = []
+        for i in range(0, len(texts), MAX_EMBED_BATCH_SIZE):
+            data = self.client.create(input=texts[i:i + MAX_EMBED_BATCH_SIZE], **params).data
+            embeddings.extend(r.embedding for r in data)
+        return embeddings
@@ -1,30 +1,106 @@
 import asyncio
+import hashlib
+import time
+from datetime import datetime
 import urllib.parse  # 1. URL 인코딩을 위해 라이브러리를 import 합니다.
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey
-from app.core.config import MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Text, DateTime, func, inspect, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from app.core.config import (
+    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, DATABASE_URL, SQL_ECHO,
+    MYSQL_POOL_SIZE, MYSQL_MAX_OVERFLOW, MYSQL_POOL_RECYCLE_SECONDS, MYSQL_POOL_TIMEOUT_SECONDS
+)
+from app.core.metrics import MYSQL_QUERY_SECONDS
+from app.core.request_context import log
 
-# 2. config에서 가져온 비밀번호를 URL 인코딩 처리합니다.
-# 이렇게 하면 비밀번호에 '@', '#', '?' 등 특수문자가 있어도 안전합니다.
-encoded_password = urllib.parse.quote_plus(MYSQL_PASSWORD)
+if DATABASE_URL is None:
+    # 2. config에서 가져온 비밀번호를 URL 인코딩 처리합니다.
+    # 이렇게 하면 비밀번호에 '@', '#', '?' 등 특수문자가 있어도 안전합니다.
+    encoded_password = urllib.parse.quote_plus(MYSQL_PASSWORD)
 
-# 3. 인코딩된 비밀번호를 사용하여 데이터베이스 연결 URL을 생성합니다.
-DATABASE_URL = f"mysql+aiomysql://{MYSQL_USER}:{encoded_password}@{MYSQL_HOST}/{MYSQL_DB}"
+    # 3. 인코딩된 비밀번호를 사용하여 데이터베이스 연결 URL을 생성합니다.
+    DATABASE_URL = f"mysql+aiomysql://{MYSQL_USER}:{encoded_password}@{MYSQL_HOST}/{MYSQL_DB}"
 
 Base = declarative_base()
 
 class Room(Base):
     __tablename__ = "rooms"
-    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(BigInteger, nullable=False)
+    # SQLite only auto-increments INTEGER primary keys (offline benchmark runs).
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False, index=True)
     title = Column(String(255), nullable=False)
     file_path = Column(String(255), nullable=False)
 
 
-# echo=True는 실행되는 SQL 쿼리를 터미널에 출력해주는 옵션입니다. (디버깅에 유용)
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+class IngestionManifest(Base):
+    """방(room)별 PDF 인제스트 상태. 배치 단위 진행 상황을 기록해 실패 시 이어서 처리할 수 있습니다."""
+    __tablename__ = "ingestion_manifests"
+    room_id = Column(BigInteger, primary_key=True)
+    # The latest ingest job; lets any worker answer GET /ingest-jobs/{job_id}.
+    job_id = Column(String(32), nullable=True, index=True)
+    content_hash = Column(String(64), nullable=False, index=True)
+    embedding_model = Column(String(100), nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    chunk_overlap = Column(Integer, nullable=False)
+    chunk_count = Column(Integer, nullable=True)
+    # Chunks per batch, and how many leading batches are fully upserted.
+    batch_size = Column(Integer, nullable=False)
+    batches_committed = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="pending")  # pending, ingesting, completed, failed
+    error = Column(Text, nullable=True)
+    # Set from Python in UTC so its age can be compared with datetime.utcnow().
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RoomDeletion(Base):
+    """삭제된 방의 툼스톤. 리퍼(reaper)가 벡터/메시지/파일 정리를 끝내면 행이 지워집니다."""
+    __tablename__ = "room_deletions"
+    room_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)
+    file_path = Column(String(255), nullable=False)
+    content_hash = Column(String(64), nullable=True)
+    chunk_count = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # UTC
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+def _pool_options(url: str) -> dict:
+    options = {"pool_recycle": MYSQL_POOL_RECYCLE_SECONDS, "pool_pre_ping": True}
+    # Sizing only applies to queue pools; e.g. SQLite's in-memory databases use a StaticPool,
+    # which rejects these arguments.
+    url = make_url(url)
+    if issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        options.update(
+            pool_size=MYSQL_POOL_SIZE,
+            max_overflow=MYSQL_MAX_OVERFLOW,
+            pool_timeout=MYSQL_POOL_TIMEOUT_SECONDS
+        )
+    return options
+
+# SQL_ECHO=true로 설정하면 실행되는 SQL 쿼리를 터미널에 출력합니다. (디버깅에 유용)
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO, **_pool_options(DATABASE_URL))
+# 모든 SQL 실행 시간을 /metrics 로 내보냅니다. (operation: SELECT, INSERT, ...)
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    MYSQL_QUERY_SECONDS.observe(elapsed, operation=statement.lstrip().split(None, 1)[0].upper())
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+# expire_on_commit=False: 커밋 후 속성에 접근해도 비동기 세션에서 암묵적 재조회(lazy load)가 일어나지 않도록 합니다.
+AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
     """데이터베이스 테이블을 생성합니다."""
@@ -32,6 +108,43 @@ async def init_db():
         # await conn.run_sync(Base.metadata.drop_all) # Commented out to prevent data loss on startup
         # Create all tables
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
+
+def _add_missing_columns(conn):
+    """create_all은 이미 존재하는 테이블에 새 컬럼도 추가하지 않으므로, 빠진 (nullable) 컬럼을 직접 추가합니다."""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                log(f"Adding column {column.name} to {table.name}")
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL")
+
+def _create_missing_indexes(conn):
+    """create_all은 이미 존재하는 테이블에 새 인덱스를 추가하지 않으므로, 빠진 인덱스를 직접 생성합니다."""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                log(f"Creating index {index.name} on {table.name}")
+                index.create(conn)
+
+def schema_fingerprint() -> str:
+    """테이블/컬럼/인덱스 정의의 해시입니다. 값이 바뀌면 다음 부팅 시 init_db()를 다시 실행합니다."""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type}:{c.nullable}:{c.primary_key}" for c in table.columns)
+        parts.extend(sorted(f"{i.name}:{','.join(c.name for c in i.columns)}" for i in table.indexes))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+def database_identity() -> str:
+    """자격 증명을 뺀 MySQL 주소(백엔드, 호스트, 포트, DB 이름)입니다."""
+    url = engine.url
+    return f"{url.get_backend_name()}://{url.host or ''}:{url.port or ''}/{url.database or ''}"
 
 async def get_db():
     """FastAPI DI를 위한 데이터베이스 세션 생성 함수입니다."""
@@ -1,17 +1,106 @@
+import time
+_import_started = time.perf_counter()
 
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from app.api.v1.api import router as api_router # Import the main API router
-from app.db.init_db import init_db
-from app.core.config import API_V1_STR
+from app.db.init_db import init_db, schema_fingerprint, database_identity
+from app.core.config import API_V1_STR, DB_SCHEMA_CHECK, SCHEMA_MARKER_PATH, WARMUP_MODE, MONGODB_URI, DB_NAME
+from app.core.metrics import render_metrics
+from app.core.request_context import RequestContextMiddleware, log
+from app.core.dependencies import init_vector_resources, get_mongo_db, close_mongo_client
+from app.services.chat_service import init_chat_indexes, CHAT_SCHEMA_VERSION
+from app.services.deletion_service import run_reaper
+from app.services.pdf_service import shutdown_extract_pool
 
-app = FastAPI(title="PDF Q&A API with PyMuPDF and Gemini")
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-@app.on_event("startup")
-async def on_startup():
+def _mongo_identity() -> str:
+    # Hosts only: anything before '@' is credentials.
+    hosts = (MONGODB_URI or "").split("://", 1)[-1].rpartition("@")[2].split("/", 1)[0]
+    return f"{hosts}/{DB_NAME}"
+
+def _current_schema() -> str:
+    # The marker says which databases were set up, not just which schema: pointing the app at a
+    # new MySQL or Mongo database must run init_db() and create the chat indexes there too.
+    return (
+        f"{schema_fingerprint()}:chat-{CHAT_SCHEMA_VERSION}"
+        f":mysql={database_identity()}:mongo={_mongo_identity()}"
+    )
+
+def _schema_check_needed() -> bool:
+    if DB_SCHEMA_CHECK == "always":
+        return True
+    if DB_SCHEMA_CHECK == "never":
+        return False
+    try:
+        with open(SCHEMA_MARKER_PATH) as f:
+            return f.read().strip() != _current_schema()
+    except FileNotFoundError:
+        return True
+
+async def _ensure_schema():
+    if not _schema_check_needed():
+        log("Schema unchanged since last boot; skipping table/index creation")
+        return
     await init_db()
+    await init_chat_indexes(await get_mongo_db())
+    if DB_SCHEMA_CHECK == "auto":
+        # Workers booting together each write their own temp file; the last replace wins.
+        tmp_path = f"{SCHEMA_MARKER_PATH}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(_current_schema())
+        os.replace(tmp_path, SCHEMA_MARKER_PATH)
+
+async def _warmup():
+    started = time.perf_counter()
+    try:
+        await run_in_threadpool(init_vector_resources)
+        log(f"Warmup finished in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        # Not fatal: each client is retried lazily by the first request that needs it.
+        log(f"Warmup failed after {time.perf_counter() - started:.2f}s: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await _ensure_schema()
+    schema_seconds = time.perf_counter() - started
+
+    app.state.warmup_task = None
+    if WARMUP_MODE == "blocking":
+        await _warmup()
+    elif WARMUP_MODE == "background":
+        app.state.warmup_task = asyncio.create_task(_warmup())
+    app.state.reaper_task = asyncio.create_task(run_reaper())
+
+    log(
+        f"Startup: imports {IMPORT_SECONDS:.2f}s, schema {schema_seconds:.2f}s, "
+        f"time-to-ready {time.perf_counter() - _import_started:.2f}s (warmup={WARMUP_MODE})"
+    )
+    yield
+
+    for task in (app.state.reaper_task, app.state.warmup_task):
+        if task is not None:
+            task.cancel()
+    close_mongo_client()
+    shutdown_extract_pool()
+
+app = FastAPI(title="PDF Q&A API with PyMuPDF and Gemini", lifespan=lifespan)
+app.add_middleware(RequestContextMiddleware)
 
 app.include_router(api_router, prefix=API_V1_STR) # Include the main API router
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the PDF Q&A API with PyMuPDF and Gemini"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, HTTP, MongoDB and MySQL timings."""
+    return render_metrics()
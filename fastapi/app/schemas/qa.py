@@ -1,5 +1,7 @@
 
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.core.config import BATCH_QUERY_MAX_QUESTIONS
 
 class UpsertRequest(BaseModel):
     title: str
@@ -11,8 +13,40 @@ class QueryRequest(BaseModel):
 class UpsertResponse(BaseModel):
     message: str
     base_id: str
+    job_id: str
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    room_id: Optional[int] = None
+    stage: str
     chunk_count: int
+    chunks_embedded: int
+    chunks_upserted: int
+    error: Optional[str] = None
 
 class QueryResponse(BaseModel):
     answer: str
     source_document_id: str
+
+class BatchQueryRequest(BaseModel):
+    room_id: int
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_QUERY_MAX_QUESTIONS)
+
+class BatchQueryItem(BaseModel):
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    source_document_id: str
+    results: List[BatchQueryItem]
+
+class AnswerCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    hit_rate: float
+    entries: int
+    bytes: int
+    similarity_threshold: float
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_BYTES
+)
+
+@dataclass
+class _Entry:
+    room_id: str
+    vector: np.ndarray  # unit-normalised float32 question embedding
+    answer: str
+    created_at: float
+    nbytes: int
+
+# Entries in LRU order (oldest first) plus a per-room index so lookups only scan one room.
+# Queries run on worker threads, so every access goes through the lock.
+_lock = threading.Lock()
+_entries: "OrderedDict[int, _Entry]" = OrderedDict()
+_room_keys: dict[str, set[int]] = {}
+_next_key = 0
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def _normalize(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _remove(key: int):
+    global _total_bytes
+    entry = _entries.pop(key)
+    _total_bytes -= entry.nbytes
+    keys = _room_keys.get(entry.room_id)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _room_keys[entry.room_id]
+
+def lookup(room_id: str, embedding) -> Optional[str]:
+    """Returns a cached answer for a question similar enough to one already answered in the room."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    vector = _normalize(embedding)
+    now = time.monotonic()
+    with _lock:
+        keys = [
+            key for key in _room_keys.get(room_id, ())
+            if now - _entries[key].created_at < ANSWER_CACHE_TTL_SECONDS
+        ]
+        for key in _room_keys.get(room_id, set()) - set(keys):
+            _remove(key)
+
+        if keys:
+            matrix = np.stack([_entries[key].vector for key in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= ANSWER_CACHE_SIMILARITY_THRESHOLD:
+                key = keys[best]
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return _entries[key].answer
+
+        _stats["misses"] += 1
+        return None
+
+def store(room_id: str, embedding, answer: str):
+    global _next_key, _total_bytes
+    if not ANSWER_CACHE_ENABLED:
+        return
+    vector = _normalize(embedding)
+    entry = _Entry(
+        room_id=room_id,
+        vector=vector,
+        answer=answer,
+        created_at=time.monotonic(),
+        nbytes=vector.nbytes + len(answer.encode("utf-8"))
+    )
+    with _lock:
+        key = _next_key
+        _next_key += 1
+        _entries[key] = entry
+        _room_keys.setdefault(room_id, set()).add(key)
+        _total_bytes += entry.nbytes
+
+        while _entries and (len(_entries) > ANSWER_CACHE_MAX_ENTRIES or _total_bytes > ANSWER_CACHE_MAX_BYTES):
+            _remove(next(iter(_entries)))
+            _stats["evictions"] += 1
+
+def invalidate_room(room_id: str):
+    """Drops every cached answer for a room; call whenever its documents change or it is deleted."""
+    with _lock:
+        for key in list(_room_keys.get(room_id, ())):
+            _remove(key)
+            _stats["invalidations"] += 1
+
+def get_stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(_entries),
+            "bytes": _total_bytes,
+            "similarity_threshold": ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        }
@@ -1,16 +1,104 @@
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from app.schemas.chat import ChatMessage
 from app.core.dependencies import get_mongo_db
+from app.core.request_context import log
 from fastapi import Depends
 
-async def get_next_sequence_number(db: AsyncIOMotorDatabase, room_id: int) -> int:
-    last_message = await db["chat_messages"].find_one(
-        {"room_id": room_id},
-        sort=[("sequence_number", -1)]
+# Fields returned by the history endpoint; room_id is already known from the query.
+MESSAGE_PROJECTION = {"_id": 1, "sequence_number": 1, "sender": 1, "content": 1, "timestamp": 1}
+
+# One document per room ({"_id": room_id, "seq": last_used}) handing out sequence numbers atomically.
+COUNTERS_COLLECTION = "chat_counters"
+
+# Bump when init_chat_indexes changes so the next boot re-runs it (see DB_SCHEMA_CHECK).
+CHAT_SCHEMA_VERSION = 1
+
+async def _renumber_duplicate_sequences(db: AsyncIOMotorDatabase) -> dict:
+    """
+    Messages saved before the counters could share a sequence_number within a room. Renumbers
+    each affected room 1..n in its current order (sequence_number, then timestamp, then _id)
+    so the unique index can be built; returns {room_id: n}.
+    """
+    rooms = set()
+    async for duplicate in db["chat_messages"].aggregate([
+        {"$group": {"_id": {"room_id": "$room_id", "seq": "$sequence_number"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]):
+        rooms.add(duplicate["_id"]["room_id"])
+
+    renumbered = {}
+    for room_id in rooms:
+        # Ids are read up front: updating the sort key under an open cursor can revisit documents.
+        messages = await db["chat_messages"].find({"room_id": room_id}, {"_id": 1}).sort(
+            [("sequence_number", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]
+        ).to_list(length=None)
+        for sequence_number, message in enumerate(messages, start=1):
+            await db["chat_messages"].update_one({"_id": message["_id"]}, {"$set": {"sequence_number": sequence_number}})
+        renumbered[room_id] = len(messages)
+        log(f"Renumbered {len(messages)} messages of room {room_id} to remove duplicate sequence numbers")
+    return renumbered
+
+async def init_chat_indexes(db: AsyncIOMotorDatabase):
+    """
+    Creates the chat_messages indexes and seeds sequence counters for rooms that predate them.
+    Duplicate sequence numbers left by the old allocation are renumbered first.
+    """
+    renumbered = await _renumber_duplicate_sequences(db)
+    await db["chat_messages"].create_index(
+        [("room_id", ASCENDING), ("sequence_number", ASCENDING)],
+        unique=True,
+        name="room_id_sequence_number_unique"
     )
-    if last_message:
-        return last_message["sequence_number"] + 1
-    return 1
+
+    # Counters are only ever advanced through $inc, so seeding from existing history is needed once.
+    if await db[COUNTERS_COLLECTION].estimated_document_count() == 0:
+        async for room in db["chat_messages"].aggregate([
+            {"$group": {"_id": "$room_id", "seq": {"$max": "$sequence_number"}}}
+        ]):
+            await db[COUNTERS_COLLECTION].update_one(
+                {"_id": room["_id"]},
+                {"$max": {"seq": room["seq"]}},
+                upsert=True
+            )
+    # Renumbering can move a room's last number past its counter.
+    for room_id, last in renumbered.items():
+        await db[COUNTERS_COLLECTION].update_one({"_id": room_id}, {"$max": {"seq": last}}, upsert=True)
+
+async def reserve_sequence_numbers(db: AsyncIOMotorDatabase, room_id: int, count: int = 1) -> int:
+    """Atomically reserves `count` consecutive sequence numbers for a room and returns the first one."""
+    counter = await db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": room_id},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"] - count + 1
+
+async def create_chat_messages(
+    db: AsyncIOMotorDatabase,
+    room_id: int,
+    messages: list[tuple[str, str]]
+) -> list[ChatMessage]:
+    """Saves several (sender, content) messages in order with one counter update and one insert."""
+    first_sequence_number = await reserve_sequence_numbers(db, room_id, len(messages))
+    chat_messages = [
+        ChatMessage(
+            id=None,
+            room_id=room_id,
+            sequence_number=first_sequence_number + i,
+            sender=sender,
+            content=content
+        )
+        for i, (sender, content) in enumerate(messages)
+    ]
+    result = await db["chat_messages"].insert_many(
+        [chat_message.model_dump(by_alias=True, exclude={'id'}) for chat_message in chat_messages]
+    )
+    for chat_message, inserted_id in zip(chat_messages, result.inserted_ids):
+        chat_message.id = str(inserted_id)
+    return chat_messages
 
 async def create_chat_message(
     db: AsyncIOMotorDatabase,
@@ -18,26 +106,40 @@ async def create_chat_message(
     sender: str,
     content: str
 ) -> ChatMessage:
-    sequence_number = await get_next_sequence_number(db, room_id)
-    chat_message = ChatMessage(
-        id=None, # Explicitly set to None
-        room_id=room_id,
-        sequence_number=sequence_number,
-        sender=sender,
-        content=content
-    )
-    message_data_to_insert = chat_message.model_dump(by_alias=True, exclude={'id'})
-    result = await db["chat_messages"].insert_one(message_data_to_insert)
-    chat_message.id = str(result.inserted_id)
-    return chat_message
-
-async def get_chat_messages(db: AsyncIOMotorDatabase, room_id: int) -> list[ChatMessage]:
-    messages = []
-    async for message in db["chat_messages"].find({"room_id": room_id}).sort("sequence_number", 1):
-        if "_id" in message:
-            message["_id"] = str(message["_id"])
-        messages.append(ChatMessage(**message))
-    return messages
+    chat_messages = await create_chat_messages(db, room_id, [(sender, content)])
+    return chat_messages[0]
+
+async def get_chat_messages_page(
+    db: AsyncIOMotorDatabase,
+    room_id: int,
+    limit: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None
+) -> list[dict]:
+    """
+    Returns one page of raw message documents in ascending sequence order, using the
+    (room_id, sequence_number) index. Without `after`, the page is the most recent
+    `limit` messages older than `before` (or the newest overall); with `after`, the
+    oldest `limit` messages newer than it.
+    """
+    sequence_filter = {}
+    if before is not None:
+        sequence_filter["$lt"] = before
+    if after is not None:
+        sequence_filter["$gt"] = after
+    query = {"room_id": room_id}
+    if sequence_filter:
+        query["sequence_number"] = sequence_filter
+
+    if after is not None:
+        cursor = db["chat_messages"].find(query, MESSAGE_PROJECTION).sort("sequence_number", ASCENDING).limit(limit)
+        return await cursor.to_list(length=limit)
+    # Newest-first to take the last `limit` messages, then flipped.
+    cursor = db["chat_messages"].find(query, MESSAGE_PROJECTION).sort("sequence_number", DESCENDING).limit(limit)
+    page = await cursor.to_list(length=limit)
+    page.reverse()
+    return page
 
 async def delete_chat_messages_by_room_id(db: AsyncIOMotorDatabase,room_id: int) :
-    await db["chat_messages"].delete_many({"room_id": room_id})
\ No newline at end of file
+    await db["chat_messages"].delete_many({"room_id": room_id})
+    await db[COUNTERS_COLLECTION].delete_one({"_id": room_id})
@@ -0,0 +1,63 @@
+import bisect
+from typing import Iterable, Iterator, NamedTuple
+
+from app.core.config import CHUNK_SIZE
+from app.core.dependencies import get_text_splitter
+
+# Part of the embedding-store key: a different chunking of the same PDF must not reuse its vectors.
+CHUNKER_VERSION = "paged1"
+
+# Text is split once the buffer holds this much; chunks ending within CHUNK_SIZE of the
+# buffer's end are held back, since more text could still change where they are cut.
+_WINDOW = CHUNK_SIZE * 4
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: int  # 1-based
+    page_end: int
+
+def iter_chunks(pages: Iterable[str]) -> Iterator[Chunk]:
+    """
+    Splits a document page by page with the configured text splitter, so only a few pages of
+    text are held at a time. Pages are joined with a space, as when splitting the whole text
+    at once, and each chunk records the pages it spans.
+    """
+    splitter = get_text_splitter()
+    buffer = ""
+    # Start offsets (within buffer) and numbers of the pages overlapping the buffer.
+    page_offsets: list[int] = []
+    page_numbers: list[int] = []
+
+    def page_at(offset: int) -> int:
+        return page_numbers[bisect.bisect_right(page_offsets, offset) - 1]
+
+    def split(final: bool) -> Iterator[Chunk]:
+        nonlocal buffer, page_offsets, page_numbers
+        search_from = 0
+        keep_from = len(buffer)
+        for text in splitter.split_text(buffer):
+            start = buffer.find(text, search_from)
+            end = start + len(text)
+            if not final and end > len(buffer) - CHUNK_SIZE:
+                keep_from = start
+                break
+            search_from = start + 1
+            yield Chunk(text, page_at(start), page_at(end - 1))
+
+        # The next chunk starts at keep_from and already contains its overlap with the last one.
+        first_page = bisect.bisect_right(page_offsets, keep_from) - 1
+        page_offsets = [max(offset - keep_from, 0) for offset in page_offsets[first_page:]]
+        page_numbers = page_numbers[first_page:]
+        buffer = buffer[keep_from:]
+
+    for page_number, page_text in enumerate(pages, start=1):
+        if buffer:
+            buffer += " "
+        page_offsets.append(len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text
+        if len(buffer) >= _WINDOW:
+            yield from split(final=False)
+
+    if buffer.strip():
+        yield from split(final=True)
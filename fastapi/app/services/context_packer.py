@@ -0,0 +1,83 @@
+import math
+from typing import Optional
+
+from app.core.config import CHUNK_OVERLAP, CONTEXT_TOKEN_BUDGET, CONTEXT_CHARS_PER_TOKEN
+from app.services.vector_backends import VectorMatch
+
+def estimate_tokens(text: str) -> int:
+    # A local estimate: counting exactly would take a round trip to the Gemini API.
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+
+def _chunk_index(vector_id: str) -> Optional[int]:
+    # Vector ids are `{room_id}-{chunk index}`.
+    _, _, index = vector_id.rpartition("-")
+    return int(index) if index.isdigit() else None
+
+# Shorter matches are more likely to be coincidence (a shared letter or word) than real overlap.
+_MIN_OVERLAP = 8
+
+def _overlap(previous: str, following: str) -> int:
+    """Length of the longest suffix of `previous` that `following` starts with (at most CHUNK_OVERLAP)."""
+    for size in range(min(len(previous), len(following), CHUNK_OVERLAP), _MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return size
+    return 0
+
+def _page_label(pages: list[tuple[int, int]]) -> str:
+    # Vectors stored before chunks carried page numbers have none.
+    if not pages:
+        return ""
+    start, end = min(p[0] for p in pages), max(p[1] for p in pages)
+    return f"[p. {start}] " if start == end else f"[pp. {start}-{end}] "
+
+def pack_context(matches: list[VectorMatch], token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Builds the prompt context from retrieved chunks: the most relevant chunks that fit in
+    token_budget, with neighbouring chunks of the document merged into one passage and the
+    text they share (CHUNK_OVERLAP) kept once. Passages are ordered by their best score and
+    tagged with their pages.
+    """
+    selected = []
+    seen_texts = set()
+    used = 0
+    for match in sorted(matches, key=lambda m: m.score, reverse=True):
+        text = match.metadata['original_text']
+        if text in seen_texts:
+            continue
+        cost = estimate_tokens(text)
+        # Always keep the best chunk, even if it alone exceeds the budget.
+        if selected and used + cost > token_budget:
+            continue
+        seen_texts.add(text)
+        selected.append(match)
+        used += cost
+
+    # Merge runs of consecutive chunk indices, in document order.
+    indexed = sorted(
+        (m for m in selected if _chunk_index(m.id) is not None),
+        key=lambda m: _chunk_index(m.id)
+    )
+    passages = []  # [best score, text, pages]
+    previous_index = None
+    for match in indexed:
+        index = _chunk_index(match.id)
+        text = match.metadata['original_text']
+        pages = []
+        if match.metadata.get('page_start') is not None:
+            # Pinecone returns numbers as floats.
+            pages.append((int(match.metadata['page_start']), int(match.metadata['page_end'])))
+        if passages and previous_index == index - 1:
+            passage = passages[-1]
+            passage[0] = max(passage[0], match.score)
+            overlap = _overlap(passage[1], text)
+            passage[1] += text[overlap:] if overlap else " " + text
+            passage[2] += pages
+        else:
+            passages.append([match.score, text, pages])
+        previous_index = index
+    for match in selected:
+        if _chunk_index(match.id) is None:
+            passages.append([match.score, match.metadata['original_text'], []])
+
+    passages.sort(key=lambda p: p[0], reverse=True)
+    return "\n\n".join(_page_label(pages) + text for _, text, pages in passages)
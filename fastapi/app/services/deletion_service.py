@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import (
+    ROOM_REAPER_INTERVAL_SECONDS, ROOM_REAPER_BATCH_SIZE, ROOM_REAPER_MAX_BACKOFF_SECONDS
+)
+from app.core.dependencies import get_mongo_db
+from app.core.request_context import log
+from app.db.init_db import AsyncSessionLocal, Room, IngestionManifest, RoomDeletion
+from app.services import answer_cache, chat_service, ingest_service, manifest_service, pdf_service, room_service, vector_service
+
+_wake_reaper = asyncio.Event()
+
+async def tombstone_room(db: AsyncSession, room_id: int) -> bool:
+    """
+    Removes a room from MySQL and leaves a tombstone for the reaper to clean up its vectors,
+    messages and files. Returns False if there was no such room.
+    """
+    room = await db.get(Room, room_id)
+    if room is None:
+        return False
+    manifest = await manifest_service.get_manifest(db, room_id)
+
+    db.add(RoomDeletion(
+        room_id=room_id,
+        user_id=room.user_id,
+        file_path=room.file_path,
+        content_hash=manifest.content_hash if manifest else None,
+        chunk_count=manifest.chunk_count if manifest else None
+    ))
+    await db.execute(delete(Room).where(Room.id == room_id))
+    # The manifest stays until the room is reaped: it tells every worker whether an ingestion
+    # is still writing the room's vectors.
+    await db.commit()
+
+    room_service.invalidate_user_rooms(room.user_id)
+    # A job in another worker notices the tombstone before its next upsert batch.
+    ingest_service.cancel_room_job(room_id)
+    answer_cache.invalidate_room(str(room_id))
+    _wake_reaper.set()
+    return True
+
+async def _is_file_shared(db: AsyncSession, file_path: str) -> bool:
+    result = await db.execute(select(func.count()).select_from(Room).where(Room.file_path == file_path))
+    return result.scalar_one() > 0
+
+async def _is_content_shared(db: AsyncSession, content_hash: str, room_id: int) -> bool:
+    result = await db.execute(
+        select(func.count()).select_from(IngestionManifest).where(
+            IngestionManifest.content_hash == content_hash,
+            IngestionManifest.room_id != room_id
+        )
+    )
+    return result.scalar_one() > 0
+
+async def _reap(db: AsyncSession, deletion: RoomDeletion, manifest: Optional[IngestionManifest]) -> Optional[str]:
+    """Deletes one room's vectors, messages and files concurrently; returns an error summary on failure."""
+    room_id = deletion.room_id
+    # An ingestion that ran on after the tombstone was written may have produced more chunks.
+    # None for rooms older than ingestion manifests: their vector ids are unknown.
+    counts = [c for c in (deletion.chunk_count, manifest.chunk_count if manifest else None) if c is not None]
+    chunk_count = max(counts) if counts else None
+    # Files can be shared with a live room (same upload name or same PDF content).
+    file_path = None if await _is_file_shared(db, deletion.file_path) else deletion.file_path
+    content_hash = deletion.content_hash
+    if content_hash and await _is_content_shared(db, content_hash, room_id):
+        content_hash = None
+
+    mongo_db = await get_mongo_db()
+    results = await asyncio.gather(
+        run_in_threadpool(vector_service.delete_vectors_by_room_id, str(room_id), chunk_count),
+        chat_service.delete_chat_messages_by_room_id(mongo_db, room_id),
+        run_in_threadpool(pdf_service.delete_pdf_files, file_path, content_hash),
+        return_exceptions=True
+    )
+    errors = [
+        f"{target}: {result}"
+        for target, result in zip(("vectors", "messages", "files"), results)
+        if isinstance(result, BaseException)
+    ]
+    return "; ".join(errors) or None
+
+async def reap_pending_deletions() -> int:
+    """Runs one pass over due tombstones. Every step is idempotent, so partial failures are simply retried."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(RoomDeletion)
+            .where(RoomDeletion.next_attempt_at <= datetime.utcnow())
+            .order_by(RoomDeletion.next_attempt_at)
+            .limit(ROOM_REAPER_BATCH_SIZE)
+        )
+        deletions = result.scalars().all()
+
+        for deletion in deletions:
+            # Wait for a running ingestion, in this or any other worker, to stop writing vectors first.
+            manifest = await manifest_service.get_manifest(db, deletion.room_id)
+            if ingest_service.is_room_ingesting(deletion.room_id) or (
+                manifest is not None and manifest_service.is_ingestion_live(manifest)
+            ):
+                continue
+            error = await _reap(db, deletion, manifest)
+            if error is None:
+                await db.delete(deletion)
+                await manifest_service.delete_manifest(db, deletion.room_id)
+                log(f"Reaped deleted room {deletion.room_id}")
+            else:
+                deletion.attempts += 1
+                deletion.last_error = error
+                backoff = min(ROOM_REAPER_INTERVAL_SECONDS * 2 ** deletion.attempts, ROOM_REAPER_MAX_BACKOFF_SECONDS)
+                deletion.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+                log(f"Cleanup of deleted room {deletion.room_id} failed (attempt {deletion.attempts}): {error}")
+            await db.commit()
+        return len(deletions)
+
+async def run_reaper():
+    """Background loop: reaps right after a deletion and otherwise every ROOM_REAPER_INTERVAL_SECONDS."""
+    while True:
+        try:
+            await asyncio.wait_for(_wake_reaper.wait(), timeout=ROOM_REAPER_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wake_reaper.clear()
+        try:
+            await reap_pending_deletions()
+        except Exception as e:
+            log(f"Room reaper pass failed: {e}")
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from app.core.metrics import Histogram
+
+EMBED_CALL_SIZE = Histogram(
+    "embedding_call_texts", "Texts per embedding API call made by the batcher.", ["kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 100, float("inf"))
+)
+
+# Queries and passages use different Upstage models ("-query" / "-passage"), so they are
+# batched separately. By default queries go first: they have a user waiting on them.
+QUERY = "query"
+PASSAGE = "passage"
+
+class _Request:
+    def __init__(self, texts: Sequence[str]):
+        self.future: Future = Future()
+        self.size = len(texts)
+        # Allocated once the first vectors arrive and the dimension is known.
+        self.results: Optional[np.ndarray] = None
+        self.remaining = len(texts)
+
+class EmbeddingBatcher:
+    """
+    Shared embedding dispatcher. Callers from any thread hand in texts and block until their
+    vectors are ready; a dispatcher thread groups texts from all callers into API calls of up
+    to max_batch_size texts, waiting at most max_wait seconds for a batch to fill, with up to
+    `concurrency` calls in flight. When both kinds are waiting, query batches go out first
+    unless prioritize_queries is off.
+    """
+
+    def __init__(
+        self,
+        embed_fns: dict[str, Callable[[list[str]], Sequence]],
+        max_batch_size: int,
+        max_wait: float,
+        concurrency: int,
+        prioritize_queries: bool = True
+    ):
+        self._embed_fns = embed_fns
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._kinds = [QUERY, PASSAGE] if prioritize_queries else [PASSAGE, QUERY]
+        # Per kind: (request, index in request, text, enqueued_at), oldest first.
+        self._pending: dict[str, deque] = {kind: deque() for kind in embed_fns}
+        self._condition = threading.Condition()
+        self._slots = threading.Semaphore(concurrency)
+        # Guards request results: one request's texts can be spread over concurrent calls.
+        self._results_lock = threading.Lock()
+        self._calls = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed-call")
+        threading.Thread(target=self._dispatch_loop, name="embed-dispatcher", daemon=True).start()
+
+    def embed(self, kind: str, texts: Sequence[str]) -> np.ndarray:
+        """Returns a float32 matrix with one row per text, in order. Blocking."""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        request = _Request(texts)
+        now = time.monotonic()
+        with self._condition:
+            self._pending[kind].extend((request, i, text, now) for i, text in enumerate(texts))
+            self._condition.notify()
+        return request.future.result()
+
+    def _next_batch(self):
+        """Waits for a batch that is full or whose oldest text has waited max_wait."""
+        with self._condition:
+            while True:
+                deadline = None
+                for kind in self._kinds:
+                    pending = self._pending[kind]
+                    if not pending:
+                        continue
+                    ready_at = pending[0][3] + self._max_wait
+                    if len(pending) >= self._max_batch_size or time.monotonic() >= ready_at:
+                        count = min(len(pending), self._max_batch_size)
+                        return kind, [pending.popleft() for _ in range(count)]
+                    deadline = ready_at if deadline is None else min(deadline, ready_at)
+                self._condition.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def _dispatch_loop(self):
+        while True:
+            # Take a call slot first, so the batch is picked (by priority) only once it can be sent.
+            self._slots.acquire()
+            kind, items = self._next_batch()
+            self._calls.submit(self._call, kind, items)
+
+    def _call(self, kind: str, items: list):
+        try:
+            EMBED_CALL_SIZE.observe(len(items), kind=kind)
+            # Converted right away: the client's lists of Python floats take ~8x the memory.
+            vectors = np.asarray(self._embed_fns[kind]([text for _, _, text, _ in items]), dtype=np.float32)
+            if vectors.ndim != 2 or len(vectors) != len(items):
+                # Matching by position would leave some callers waiting forever.
+                raise ValueError(f"Embedding API returned {len(vectors)} vectors for {len(items)} texts")
+        except BaseException as e:
+            with self._results_lock:
+                for request, _, _, _ in items:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        with self._results_lock:
+            for (request, index, _, _), vector in zip(items, vectors):
+                if request.results is None:
+                    request.results = np.empty((request.size, vectors.shape[1]), dtype=np.float32)
+                request.results[index] = vector
+                request.remaining -= 1
+                if request.remaining == 0 and not request.future.done():
+                    request.future.set_result(request.results)
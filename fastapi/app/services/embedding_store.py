@@ -0,0 +1,76 @@
+import os
+import threading
+import uuid
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import (
+    EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_MODEL, EMBEDDING_DIMENSION,
+    CHUNK_SIZE, CHUNK_OVERLAP
+)
+from app.core.file_cache import touch, evict_lru
+from app.core.request_context import log
+from app.services.chunker import CHUNKER_VERSION
+
+if EMBEDDING_CACHE_DIR:
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+
+_ROW_BYTES = EMBEDDING_DIMENSION * 4
+
+def _embedding_path(content_hash: str) -> str:
+    # Chunks are a pure function of the text and the chunker/splitter settings, so those go into the key too.
+    name = f"{content_hash}-{EMBEDDING_MODEL}-{CHUNKER_VERSION}-{CHUNK_SIZE}-{CHUNK_OVERLAP}.f32"
+    return os.path.join(EMBEDDING_CACHE_DIR, name)
+
+def load_embeddings(content_hash: str) -> Optional[np.ndarray]:
+    """
+    Returns the stored (chunk_count, EMBEDDING_DIMENSION) float32 matrix for a PDF, if there is one.
+    Files are only published once complete, so the row count is the PDF's chunk count.
+    """
+    if not EMBEDDING_CACHE_DIR:
+        return None
+    path = _embedding_path(content_hash)
+    if not os.path.exists(path):
+        return None
+    size = os.path.getsize(path)
+    if size == 0 or size % _ROW_BYTES:
+        return None
+    touch(path)
+    log(f"Reusing stored embeddings: {path}")
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(size // _ROW_BYTES, EMBEDDING_DIMENSION))
+
+class EmbeddingWriter:
+    """
+    Collects embedding batches for one PDF as they finish, in any order, and publishes
+    the file only once every row has been written.
+    """
+
+    def __init__(self, content_hash: str):
+        self.path = _embedding_path(content_hash)
+        self._tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._lock = threading.Lock()
+
+    def write(self, start: int, vectors):
+        data = np.asarray(vectors, dtype=np.float32).tobytes()
+        with self._lock:
+            self._file.seek(start * _ROW_BYTES)
+            self._file.write(data)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        evict_lru(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES)
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+def open_embedding_writer(content_hash: str) -> Optional[EmbeddingWriter]:
+    if not EMBEDDING_CACHE_DIR:
+        return None
+    return EmbeddingWriter(content_hash)
@@ -0,0 +1,162 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.core.config import (
+    INGEST_MAX_RUNNING_JOBS, INGEST_MAX_PENDING_JOBS, INGEST_MAX_PENDING_BYTES,
+    INGEST_JOB_RETENTION_SECONDS, INGEST_STALE_SECONDS
+)
+from app.core.request_context import log
+from app.db.init_db import AsyncSessionLocal
+from app.services import pdf_service, vector_service, manifest_service
+
+@dataclass
+class IngestJob:
+    job_id: str
+    size_bytes: int
+    room_id: Optional[int] = None
+    stage: str = "queued"  # queued -> embedding (pages are extracted as they are embedded) -> completed | failed
+    error: Optional[str] = None
+    progress: vector_service.IngestProgress = field(default_factory=vector_service.IngestProgress)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("completed", "failed")
+
+# Jobs live in this process only. Other workers (and this one after a restart) report a job's
+# status from the room's ingestion manifest, which records the job id.
+_jobs: dict[str, IngestJob] = {}
+_tasks: set[asyncio.Task] = set()
+_active_rooms: dict[int, asyncio.Task] = {}
+_running_slots = asyncio.Semaphore(INGEST_MAX_RUNNING_JOBS)
+_pending_jobs = 0
+_pending_bytes = 0
+
+def _prune_finished_jobs():
+    cutoff = time.time() - INGEST_JOB_RETENTION_SECONDS
+    for job_id in [job_id for job_id, job in _jobs.items() if job.finished and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+def create_job(size_bytes: int) -> IngestJob:
+    """Admits an upload for ingestion, or raises 503 when the pending queue is full."""
+    global _pending_jobs, _pending_bytes
+    _prune_finished_jobs()
+    if _pending_jobs >= INGEST_MAX_PENDING_JOBS or (
+        _pending_jobs and _pending_bytes + size_bytes > INGEST_MAX_PENDING_BYTES
+    ):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many uploads are being processed. Please try again shortly.",
+            headers={"Retry-After": "30"}
+        )
+    job = IngestJob(job_id=uuid.uuid4().hex, size_bytes=size_bytes)
+    _jobs[job.job_id] = job
+    _pending_jobs += 1
+    _pending_bytes += size_bytes
+    return job
+
+def _release(job: IngestJob):
+    global _pending_jobs, _pending_bytes
+    _pending_jobs -= 1
+    _pending_bytes -= job.size_bytes
+
+def discard_job(job: IngestJob):
+    """Gives back an admitted job's slot when the upload fails before ingestion starts."""
+    _jobs.pop(job.job_id, None)
+    _release(job)
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    return _jobs.get(job_id)
+
+def is_room_ingesting(room_id: int) -> bool:
+    return room_id in _active_rooms
+
+def cancel_room_job(room_id: int):
+    """Stops this process's ingestion of a room, e.g. because the room is being deleted."""
+    task = _active_rooms.get(room_id)
+    if task is not None:
+        task.cancel()
+
+async def _mark_manifest_failed(db, room_id: int, error: str, chunks_produced: int):
+    await db.rollback()
+    manifest = await manifest_service.get_manifest(db, room_id)
+    # A 409 for an already-ingested room must not flip its manifest to failed.
+    if manifest is not None and manifest.status != "completed":
+        manifest_service.record_chunks_produced(manifest, chunks_produced)
+        await manifest_service.mark_finished(db, manifest, error=error)
+
+async def _record_cancelled_job(room_id: int, chunks_produced: int):
+    """
+    Marks the manifest of a cancelled job (its room is being deleted) as failed, so the reaper
+    stops waiting for it, and records how far it got: the reaper deletes vectors up to the
+    larger of the manifest's and the tombstone's chunk counts.
+    """
+    async with AsyncSessionLocal() as db:
+        await _mark_manifest_failed(db, room_id, "Cancelled", chunks_produced)
+
+async def _wait_for_slot(job: IngestJob):
+    # The manifest stays "pending" while the job waits; touching it keeps other workers from
+    # taking the queued job for one that died and starting a second ingestion of the room.
+    while True:
+        try:
+            await asyncio.wait_for(_running_slots.acquire(), timeout=INGEST_STALE_SECONDS / 3)
+            return
+        except asyncio.TimeoutError:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await manifest_service.touch_pending(db, job.room_id)
+            except Exception as e:
+                log(f"Could not refresh the manifest of queued ingest job {job.job_id}: {e}")
+
+async def _run_job(job: IngestJob, file_location: str, content_hash: str):
+    acquired = False
+    try:
+        await _wait_for_slot(job)
+        acquired = True
+        async with AsyncSessionLocal() as db:
+            try:
+                job.stage = "embedding"
+                await vector_service.upsert_pages_to_pinecone(
+                    room_id=str(job.room_id),
+                    pages=pdf_service.iter_pages(content_hash, file_location),
+                    db=db,
+                    content_hash=content_hash,
+                    progress=job.progress
+                )
+                job.stage = "completed"
+                log(f"Ingest job {job.job_id} for room {job.room_id} completed ({job.progress.chunk_count} chunks)")
+            except Exception as e:
+                job.stage = "failed"
+                job.error = e.detail if isinstance(e, HTTPException) else str(e)
+                log(f"Ingest job {job.job_id} for room {job.room_id} failed: {job.error}")
+                await _mark_manifest_failed(db, job.room_id, job.error, job.progress.chunk_count)
+    except asyncio.CancelledError:
+        job.stage = "failed"
+        job.error = "Cancelled"
+        log(f"Ingest job {job.job_id} for room {job.room_id} was cancelled")
+        try:
+            await _record_cancelled_job(job.room_id, job.progress.chunk_count)
+        except Exception as e:
+            log(f"Could not record chunk count of cancelled ingest job {job.job_id}: {e}")
+    except Exception as e:
+        log(f"Could not record failure of ingest job {job.job_id}: {e}")
+    finally:
+        if acquired:
+            _running_slots.release()
+        job.finished_at = time.time()
+        _active_rooms.pop(job.room_id, None)
+        _release(job)
+
+def start_job(job: IngestJob, room_id: int, file_location: str, content_hash: str):
+    job.room_id = room_id
+    task = asyncio.create_task(_run_job(job, file_location, content_hash))
+    _active_rooms[room_id] = task
+    # Keep a reference so the task isn't garbage-collected while it runs.
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select, update
+from app.db.init_db import IngestionManifest
+from app.core.config import EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP, INGEST_EMBED_BATCH_SIZE, INGEST_STALE_SECONDS
+
+def new_manifest(room_id: int, content_hash: str, job_id: Optional[str] = None) -> IngestionManifest:
+    return IngestionManifest(
+        room_id=room_id,
+        job_id=job_id,
+        content_hash=content_hash,
+        embedding_model=EMBEDDING_MODEL,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        batch_size=INGEST_EMBED_BATCH_SIZE,
+        batches_committed=0,
+        status="pending"
+    )
+
+async def get_manifest(db: AsyncSession, room_id: int) -> Optional[IngestionManifest]:
+    return await db.get(IngestionManifest, room_id)
+
+async def get_manifest_by_job_id(db: AsyncSession, job_id: str) -> Optional[IngestionManifest]:
+    result = await db.execute(select(IngestionManifest).where(IngestionManifest.job_id == job_id))
+    return result.scalars().first()
+
+def is_ingestion_live(manifest: IngestionManifest) -> bool:
+    """Whether some worker, in any process, has the room's ingestion queued or running right now."""
+    return (
+        manifest.status in ("pending", "ingesting")
+        and datetime.utcnow() - manifest.updated_at < timedelta(seconds=INGEST_STALE_SECONDS)
+    )
+
+def resume_chunk_index(manifest: IngestionManifest, content_hash: str) -> int:
+    """
+    Index of the first chunk still to be ingested. Earlier batches are only skipped when they
+    were produced from the same PDF with the same model, splitter and batch settings.
+    """
+    if (
+        manifest.content_hash == content_hash
+        and manifest.embedding_model == EMBEDDING_MODEL
+        and manifest.chunk_size == CHUNK_SIZE
+        and manifest.chunk_overlap == CHUNK_OVERLAP
+        and manifest.batch_size == INGEST_EMBED_BATCH_SIZE
+    ):
+        return manifest.batches_committed * manifest.batch_size
+    return 0
+
+async def mark_pending(db: AsyncSession, manifest: IngestionManifest, job_id: str):
+    manifest.job_id = job_id
+    manifest.status = "pending"
+    manifest.error = None
+    manifest.updated_at = datetime.utcnow()
+    await db.commit()
+
+async def touch_pending(db: AsyncSession, room_id: int):
+    """Keeps a queued job's manifest fresh so other workers don't take it for an abandoned one."""
+    await db.execute(
+        update(IngestionManifest)
+        .where(IngestionManifest.room_id == room_id, IngestionManifest.status == "pending")
+        .values(updated_at=datetime.utcnow())
+    )
+    await db.commit()
+
+async def mark_ingesting(db: AsyncSession, manifest: IngestionManifest, start_chunk: int):
+    manifest.batch_size = INGEST_EMBED_BATCH_SIZE
+    manifest.batches_committed = start_chunk // INGEST_EMBED_BATCH_SIZE
+    manifest.embedding_model = EMBEDDING_MODEL
+    manifest.chunk_size = CHUNK_SIZE
+    manifest.chunk_overlap = CHUNK_OVERLAP
+    manifest.status = "ingesting"
+    manifest.error = None
+    await db.commit()
+
+def record_chunks_produced(manifest: IngestionManifest, chunk_count: int):
+    # chunk_count bounds the vector ids `{room_id}-{i}` that may exist, across all attempts,
+    # so deleting the room can remove them by id. It is saved with the next commit.
+    manifest.chunk_count = max(manifest.chunk_count or 0, chunk_count)
+
+async def record_batches_committed(db: AsyncSession, manifest: IngestionManifest, batches_committed: int):
+    manifest.batches_committed = batches_committed
+    await db.commit()
+
+async def mark_finished(db: AsyncSession, manifest: IngestionManifest, error: Optional[str] = None):
+    manifest.status = "failed" if error else "completed"
+    manifest.error = error
+    await db.commit()
+
+async def delete_manifest(db: AsyncSession, room_id: int):
+    await db.execute(delete(IngestionManifest).where(IngestionManifest.room_id == room_id))
@@ -1,35 +1,213 @@
 
 import os
+import gzip
+import json
+import hashlib
+import uuid
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Optional
 import fitz  # PyMuPDF
 from fastapi import UploadFile, HTTPException
-from app.core.config import TEXT_CACHE_DIR
+from app.core.config import (
+    TEXT_CACHE_DIR, TEXT_CACHE_MAX_BYTES, MAX_UPLOAD_BYTES,
+    PDF_EXTRACT_WORKERS, PDF_EXTRACT_PARALLEL_MIN_PAGES, PDF_EXTRACT_PAGES_PER_TASK
+)
+from app.core.file_cache import touch, evict_lru
+from app.core.metrics import timed, STAGE_SECONDS, STAGE_ITEMS
+from app.services.pdf_extract_worker import extract_page_range
+from app.core.request_context import log
 
 os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
 
-async def get_text_from_pdf(title: str, file: UploadFile) -> str:
-    text_file_path = os.path.join(TEXT_CACHE_DIR, f"{title}.txt")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-    if os.path.exists(text_file_path):
-        print(f"Loading text from cache: {text_file_path}")
-        with open(text_file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    else:
-        print("No cache found. Extracting text directly from PDF with PyMuPDF...")
+# Shared by all uploads, created on first use.
+_extract_pool: Optional[ProcessPoolExecutor] = None
+_extract_pool_lock = threading.Lock()
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn, not fork: the server process has threads (and open clients) that a fork would copy.
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extract_pool
+
+def _discard_extract_pool(pool: ProcessPoolExecutor):
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is pool:
+            _extract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is not None:
+            _extract_pool.shutdown(wait=False, cancel_futures=True)
+            _extract_pool = None
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"PDF exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes.")
+
+def safe_filename(filename: Optional[str]) -> str:
+    """The client's file name without any directory part, short enough for Room.file_path."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        name = "upload.pdf"
+    return name[-150:]
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file on disk. Blocking."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def save_upload(file: UploadFile, file_location: str) -> str:
+    """
+    Streams the upload to disk and returns the SHA-256 of its bytes, computed in the same pass.
+    Blocking: call it from a worker thread. Raises 413 once more than MAX_UPLOAD_BYTES arrive.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    tmp_path = f"{file_location}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise upload_too_large()
+                sha256.update(chunk)
+                buffer.write(chunk)
+            # Ingestion runs after the request returns, so the file must survive a crash from here on.
+            buffer.flush()
+            os.fsync(buffer.fileno())
+        # Readers never see a partially written PDF under the final name.
+        os.replace(tmp_path, file_location)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return sha256.hexdigest()
+
+def _text_cache_path(content_hash: str) -> str:
+    return os.path.join(TEXT_CACHE_DIR, f"{content_hash}.jsonl.gz")
+
+def _read_text_cache(text_file_path: str) -> Iterator[str]:
+    # One JSON-encoded string per page.
+    with gzip.open(text_file_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def delete_pdf_files(file_path: Optional[str], content_hash: Optional[str]):
+    """Removes an uploaded PDF and/or its cached text; callers check no other room still uses them."""
+    paths = []
+    if file_path:
+        paths.append(file_path)
+    if content_hash:
+        paths.append(_text_cache_path(content_hash))
+    for path in paths:
         try:
-            pdf_content = await file.read()
-            doc = fitz.open(stream=pdf_content, filetype="pdf")
-            
-            text_parts = []
-            for page in doc:
-                text_parts.append(page.get_text())
-            
-            text = " ".join(text_parts)
-            doc.close()
-
-            print(f"Saving text to cache: {text_file_path}")
-            with open(text_file_path, "w", encoding="utf-8") as f:
-                f.write(text)
-            
-            return text
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def _extract_pages_inline(doc) -> Iterator[str]:
+    for page in doc:
+        try:
+            with timed("pdf_extract", items=1):
+                page_text = page.get_text()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {e}")
+        yield page_text
+
+def _extract_pages_parallel(file_path: str, page_count: int) -> Iterator[str]:
+    """
+    Extracts page ranges in the process pool, each worker opening the file itself, and yields
+    the pages in order. Only a few ranges per worker are submitted ahead of the consumer.
+    """
+    pool = _get_extract_pool()
+    ranges = iter(range(0, page_count, PDF_EXTRACT_PAGES_PER_TASK))
+    in_flight = deque()
+
+    def submit_next():
+        start = next(ranges, None)
+        if start is not None:
+            end = min(start + PDF_EXTRACT_PAGES_PER_TASK, page_count)
+            in_flight.append(pool.submit(extract_page_range, file_path, start, end))
+
+    try:
+        for _ in range(PDF_EXTRACT_WORKERS * 2):
+            submit_next()
+        while in_flight:
+            try:
+                pages, seconds = in_flight.popleft().result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # A crashed worker (e.g. OOM-killed) breaks the whole pool; start a new one next time.
+                    _discard_extract_pool(pool)
+                raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {e}")
+            submit_next()
+            STAGE_SECONDS.observe(seconds, stage="pdf_extract_range")
+            STAGE_ITEMS.inc(len(pages), stage="pdf_extract_range")
+            yield from pages
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def iter_pages(content_hash: str, file_path: str) -> Iterator[str]:
+    """
+    Yields the PDF's text page by page, from the text cache when present. Otherwise pages are
+    extracted with PyMuPDF as they are consumed and the cache is written alongside, published
+    only once the last page has been read.
+    """
+    text_file_path = _text_cache_path(content_hash)
+
+    if os.path.exists(text_file_path):
+        log(f"Loading text from cache: {text_file_path}")
+        touch(text_file_path)
+        yield from _read_text_cache(text_file_path)
+        return
+
+    log("No cache found. Extracting text directly from PDF with PyMuPDF...")
+    try:
+        # Opened by path: PyMuPDF reads pages from the file as needed instead of from an in-memory copy.
+        doc = fitz.open(file_path, filetype="pdf")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {e}")
+
+    tmp_path = f"{text_file_path}.{uuid.uuid4().hex}.tmp"
+    published = False
+    try:
+        with doc, gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as cache:
+            if PDF_EXTRACT_WORKERS > 1 and doc.page_count >= PDF_EXTRACT_PARALLEL_MIN_PAGES:
+                pages = _extract_pages_parallel(file_path, doc.page_count)
+            else:
+                pages = _extract_pages_inline(doc)
+            for page_text in pages:
+                cache.write(json.dumps(page_text, ensure_ascii=False))
+                cache.write("\n")
+                yield page_text
+
+        log(f"Saving text to cache: {text_file_path}")
+        os.replace(tmp_path, text_file_path)
+        published = True
+        evict_lru(TEXT_CACHE_DIR, TEXT_CACHE_MAX_BYTES)
+    finally:
+        # Extraction failed or the consumer stopped early.
+        if not published:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
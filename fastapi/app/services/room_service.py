@@ -1,14 +1,46 @@
+import itertools
+import time
+from collections import OrderedDict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select,delete
+from sqlalchemy import select
 from app.schemas.chat import ChatRoomResponse
-from app.db.init_db import Room
+from app.db.init_db import Room, AsyncSessionLocal
+from app.core.config import ROOM_LIST_CACHE_TTL_SECONDS, ROOM_LIST_CACHE_MAX_ENTRIES
 
-async def get_rooms_by_user_id(db: AsyncSession, user_id: int) -> list[ChatRoomResponse]:
-    result = await db.execute(select(Room).filter(Room.user_id == user_id))
-    rooms = result.scalars().all()
-    return [ChatRoomResponse(room_id=room.id, title=room.title) for room in rooms]
+# Read-through cache of room lists: user_id -> (cached_at, rooms), least recently used first.
+_room_lists: "OrderedDict[int, tuple[float, list[ChatRoomResponse]]]" = OrderedDict()
+# Set to a fresh value on every invalidation, so a listing read before a room was
+# created/deleted is never stored over the invalidation. Values are never reused, which
+# makes dropping old entries safe (a dropped entry only prevents a store).
+_generations: dict[int, int] = {}
+_generation_counter = itertools.count(1)
+
+def invalidate_user_rooms(user_id: int):
+    _room_lists.pop(user_id, None)
+    _generations.pop(user_id, None)
+    _generations[user_id] = next(_generation_counter)
+    while len(_generations) > ROOM_LIST_CACHE_MAX_ENTRIES:
+        del _generations[next(iter(_generations))]
+
+async def _load_rooms(db: AsyncSession, user_id: int) -> list[ChatRoomResponse]:
+    result = await db.execute(select(Room.id, Room.title).where(Room.user_id == user_id))
+    return [ChatRoomResponse(room_id=room_id, title=title) for room_id, title in result.all()]
+
+async def get_rooms_by_user_id(user_id: int) -> list[ChatRoomResponse]:
+    """Returns a user's rooms, opening a MySQL session only on a cache miss."""
+    cached = _room_lists.get(user_id)
+    if cached is not None and time.monotonic() - cached[0] < ROOM_LIST_CACHE_TTL_SECONDS:
+        _room_lists.move_to_end(user_id)
+        return cached[1]
+
+    generation = _generations.get(user_id, 0)
+    async with AsyncSessionLocal() as db:
+        rooms = await _load_rooms(db, user_id)
+
+    if _generations.get(user_id, 0) == generation:
+        _room_lists[user_id] = (time.monotonic(), rooms)
+        _room_lists.move_to_end(user_id)
+        while len(_room_lists) > ROOM_LIST_CACHE_MAX_ENTRIES:
+            _room_lists.popitem(last=False)
+    return rooms
 
-async def delete_rooms_by_user_id(db: AsyncSession, room_id: int):
-    stmt = delete(Room).where(Room.id == room_id)
-    await db.execute(stmt)
-    await db.commit()
\ No newline at end of file
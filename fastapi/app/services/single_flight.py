@@ -0,0 +1,36 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from app.core.metrics import Counter
+
+T = TypeVar("T")
+
+COALESCED = Counter(
+    "single_flight_coalesced_total", "Calls that joined an identical call already in flight.", ["operation"]
+)
+
+_in_flight: dict[Hashable, asyncio.Task] = {}
+
+async def run_once(operation: str, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs factory() unless a call with the same (operation, key) is already in flight, in which
+    case the caller waits for that call's result (or exception) instead. Nothing is kept once
+    the call finishes.
+    """
+    flight_key = (operation, key)
+    task = _in_flight.get(flight_key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _in_flight[flight_key] = task
+        task.add_done_callback(lambda done: _finish(flight_key, done))
+    else:
+        COALESCED.inc(operation=operation)
+    # A caller that goes away (e.g. client disconnect) must not cancel the call for the others.
+    return await asyncio.shield(task)
+
+def _finish(flight_key: Hashable, task: asyncio.Task):
+    if _in_flight.get(flight_key) is task:
+        del _in_flight[flight_key]
+    # Mark the exception as retrieved in case every waiter was cancelled.
+    if not task.cancelled():
+        task.exception()
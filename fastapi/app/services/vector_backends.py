@@ -0,0 +1,275 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import shutil
+import threading
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+class VectorMatch(NamedTuple):
+    id: str
+    score: float
+    metadata: dict
+
+class VectorBackend(ABC):
+    """
+    Storage for chunk embeddings, partitioned by room. `vectors` is any 2-D array-like of
+    shape (len(ids), dimension); rows line up with `ids` and `metadatas`.
+    """
+
+    @abstractmethod
+    def upsert(self, room_id: str, ids: Sequence[str], vectors, metadatas: Sequence[dict]) -> None:
+        ...
+
+    @abstractmethod
+    def query(self, room_id: str, vector, top_k: int) -> list[VectorMatch]:
+        ...
+
+    @abstractmethod
+    def delete_room(self, room_id: str, vector_ids: Optional[Sequence[str]]) -> None:
+        """
+        Removes a room's vectors; `vector_ids` lists every id that was upserted for it, or is
+        None for rooms stored before the ids were tracked.
+        """
+
+def room_namespace(room_id: str) -> str:
+    return f"room-{room_id}"
+
+class PineconeVectorBackend(VectorBackend):
+    """
+    All rooms share one Pinecone index, each in its own namespace, so a query only scans the
+    room's vectors and deleting a room drops its namespace. Vectors still carry `room_id` in
+    their metadata.
+
+    Rooms stored before namespaces were introduced sit in the default namespace, told apart by
+    a `room_id` metadata filter. With legacy_filter_fallback, those are still queried and deleted
+    until scripts.migrate_pinecone_namespaces has moved them.
+    """
+
+    # Upper bound on one float32 value serialized as JSON, e.g. "-0.012345678918361664,".
+    _VALUE_BYTES = 24
+    # Per-vector JSON keys and punctuation.
+    _VECTOR_OVERHEAD_BYTES = 64
+
+    def __init__(
+        self,
+        index,
+        dimension: int,
+        max_request_bytes: int = 2 * 1024 * 1024,
+        max_request_vectors: int = 1000,
+        legacy_filter_fallback: bool = False
+    ):
+        self.index = index
+        self.dimension = dimension
+        self.max_request_bytes = max_request_bytes
+        self.max_request_vectors = max_request_vectors
+        self.legacy_filter_fallback = legacy_filter_fallback
+
+    def _request_ranges(self, ids: Sequence[str], metadatas: Sequence[dict]):
+        """Yields consecutive (start, end) row ranges whose upsert requests fit the size limits."""
+        vector_bytes = self.dimension * self._VALUE_BYTES + self._VECTOR_OVERHEAD_BYTES
+        start, size = 0, 0
+        for row, (vector_id, metadata) in enumerate(zip(ids, metadatas)):
+            row_bytes = vector_bytes + len(vector_id) + len(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+            if row > start and (size + row_bytes > self.max_request_bytes or row - start >= self.max_request_vectors):
+                yield start, row
+                start, size = row, 0
+            size += row_bytes
+        if start < len(ids):
+            yield start, len(ids)
+
+    def upsert(self, room_id, ids, vectors, metadatas):
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        metadatas = [{**metadata, 'room_id': room_id} for metadata in metadatas]
+        # Only one request's worth of rows is converted to Python floats at a time.
+        for start, end in self._request_ranges(ids, metadatas):
+            self.index.upsert(
+                vectors=[
+                    {'id': vector_id, 'values': values, 'metadata': metadata}
+                    for vector_id, values, metadata in zip(ids[start:end], matrix[start:end].tolist(), metadatas[start:end])
+                ],
+                namespace=room_namespace(room_id)
+            )
+
+    def query(self, room_id, vector, top_k):
+        values = np.asarray(vector, dtype=np.float32).tolist()
+        result = self.index.query(
+            vector=values,
+            namespace=room_namespace(room_id),
+            top_k=top_k,
+            include_metadata=True,
+            include_values=False
+        )
+        if not result['matches'] and self.legacy_filter_fallback:
+            result = self.index.query(
+                vector=values,
+                filter={'room_id': room_id},
+                top_k=top_k,
+                include_metadata=True,
+                include_values=False
+            )
+        return [VectorMatch(match['id'], match['score'], match['metadata']) for match in result['matches']]
+
+    # Pinecone accepts at most 1000 ids per delete request.
+    DELETE_BATCH_SIZE = 1000
+
+    def delete_room(self, room_id, vector_ids):
+        from pinecone.exceptions import NotFoundException
+        try:
+            self.index.delete(delete_all=True, namespace=room_namespace(room_id))
+        except NotFoundException:
+            # Nothing was ever stored in it.
+            pass
+        if self.legacy_filter_fallback:
+            if vector_ids is None:
+                vector_ids = self._list_legacy_ids(room_id)
+                if vector_ids is None:
+                    self.index.delete(filter={'room_id': room_id})
+                    return
+            # Deleting by id avoids metadata-filtered deletes, which are slow and not supported on serverless indexes.
+            for start in range(0, len(vector_ids), self.DELETE_BATCH_SIZE):
+                self.index.delete(ids=list(vector_ids[start:start + self.DELETE_BATCH_SIZE]))
+
+    def _list_legacy_ids(self, room_id: str) -> Optional[list[str]]:
+        """
+        Ids `{room_id}-*` in the default namespace, for rooms whose chunk count was never recorded;
+        None where listing isn't supported (pod-based indexes).
+        """
+        from pinecone.exceptions import PineconeApiException
+        try:
+            # Read in full before deleting: deletes could shift the pagination.
+            return [vector_id for page in self.index.list(prefix=f"{room_id}-", namespace="") for vector_id in page]
+        except PineconeApiException:
+            return None
+
+class _LocalRoom(NamedTuple):
+    ids: list[str]
+    metadatas: list[dict]
+    matrix: np.ndarray  # (rows, dimension) float32, rows unit-normalised
+    files: tuple  # _file_state when loaded
+
+def _file_state(room_dir: str) -> Optional[tuple]:
+    """(inode, size, mtime) of both room files, or None if the room has no vectors."""
+    state = []
+    for name in ("vectors.f32", "rows.jsonl"):
+        try:
+            st = os.stat(os.path.join(room_dir, name))
+        except FileNotFoundError:
+            return None
+        state.append((st.st_ino, st.st_size, st.st_mtime_ns))
+    return tuple(state)
+
+class LocalVectorBackend(VectorBackend):
+    """
+    In-process index for running without Pinecone. Each room is a directory holding
+    `vectors.f32` (unit-normalised float32 rows, appended per upsert) and `rows.jsonl`
+    (id and metadata per row). Queries memory-map the matrix and take an exact
+    cosine top-k with one matrix-vector product.
+
+    Several workers can share the directory: a loaded room is reloaded whenever its files
+    change on disk, and dropped when they are gone.
+    """
+
+    def __init__(self, directory: str, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+        self._rooms: dict[str, _LocalRoom] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _room_dir(self, room_id: str) -> str:
+        return os.path.join(self.directory, room_id)
+
+    def _lock(self, room_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(room_id, threading.Lock())
+
+    def upsert(self, room_id, ids, vectors, metadatas):
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        room_dir = self._room_dir(room_id)
+        with self._lock(room_id):
+            os.makedirs(room_dir, exist_ok=True)
+            # Rows and their metadata are appended under the same lock so line i describes row i.
+            with open(os.path.join(room_dir, "vectors.f32"), "ab") as f:
+                f.write(matrix.tobytes())
+            with open(os.path.join(room_dir, "rows.jsonl"), "a", encoding="utf-8") as f:
+                for vector_id, metadata in zip(ids, metadatas):
+                    f.write(json.dumps({"id": vector_id, "metadata": metadata}, ensure_ascii=False))
+                    f.write("\n")
+            self._rooms.pop(room_id, None)
+
+    def _load(self, room_id: str) -> Optional[_LocalRoom]:
+        room_dir = self._room_dir(room_id)
+        files = _file_state(room_dir)
+        if files is None:
+            self._rooms.pop(room_id, None)
+            return None
+        room = self._rooms.get(room_id)
+        if room is not None and room.files == files:
+            return room
+
+        with self._lock(room_id):
+            # Taken before reading: a write that lands meanwhile changes it, so the next query reloads.
+            files = _file_state(room_dir)
+            if files is None:
+                self._rooms.pop(room_id, None)
+                return None
+            room = self._rooms.get(room_id)
+            if room is not None and room.files == files:
+                return room
+            vectors_path = os.path.join(room_dir, "vectors.f32")
+
+            ids, metadatas = [], []
+            try:
+                with open(os.path.join(room_dir, "rows.jsonl"), encoding="utf-8") as f:
+                    for line in f:
+                        row = json.loads(line)
+                        ids.append(row["id"])
+                        metadatas.append(row["metadata"])
+                # An interrupted append can leave one side short; only complete rows count.
+                row_count = min(len(ids), os.path.getsize(vectors_path) // (self.dimension * 4))
+            except FileNotFoundError:
+                # Deleted by another worker since the stat.
+                row_count = 0
+            ids, metadatas = ids[:row_count], metadatas[:row_count]
+            if row_count == 0:
+                self._rooms.pop(room_id, None)
+                return None
+            matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(row_count, self.dimension))
+
+            # A re-upserted id keeps only its latest row.
+            latest = {vector_id: row for row, vector_id in enumerate(ids)}
+            if len(latest) != len(ids):
+                rows = sorted(latest.values())
+                ids = [ids[row] for row in rows]
+                metadatas = [metadatas[row] for row in rows]
+                matrix = np.ascontiguousarray(matrix[rows])
+
+            room = _LocalRoom(ids, metadatas, matrix, files)
+            self._rooms[room_id] = room
+            return room
+
+    def query(self, room_id, vector, top_k):
+        room = self._load(room_id)
+        if room is None:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = room.matrix @ query
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [VectorMatch(room.ids[row], float(scores[row]), room.metadatas[row]) for row in top]
+
+    def delete_room(self, room_id, vector_ids):
+        with self._lock(room_id):
+            self._rooms.pop(room_id, None)
+            shutil.rmtree(self._room_dir(room_id), ignore_errors=True)
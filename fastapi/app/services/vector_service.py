@@ -1,74 +1,362 @@
 
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Union
 from fastapi import HTTPException
-from langchain_pinecone import PineconeVectorStore
-from langchain.chains import RetrievalQA
-
-from app.core.dependencies import get_pinecone_index, embeddings, llm, text_splitter
-from app.core.config import PINECONE_INDEX_NAME, EMBEDDING_DIMENSION
-
-def upsert_text_to_pinecone(room_id: str, text: str):
-    index = get_pinecone_index()
-
-    dummy_vector = [0.0] * EMBEDDING_DIMENSION
-    existing_vectors = index.query(
-        vector=dummy_vector,
-        filter={'room_id': room_id},
-        top_k=1,
-        include_metadata=False,
-        include_values=False
-    )
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.dependencies import get_vector_backend, get_qa_prompt, get_llm, embed_texts
+from app.core.metrics import timed, STAGE_SECONDS
+from app.core.request_context import log
+from app.db.init_db import AsyncSessionLocal, Room
+from app.core.config import (
+    QUERY_CONCURRENCY, RETRIEVAL_TOP_K, BATCH_QUERY_CONCURRENCY,
+    INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_WORKERS, INGEST_UPSERT_WORKERS,
+    INGEST_QUEUE_SIZE
+)
+from app.services import answer_cache, manifest_service, single_flight
+from app.services.chunker import Chunk, iter_chunks
+from app.services.context_packer import pack_context
+from app.services.embedding_store import load_embeddings, open_embedding_writer
+from app.services.vector_backends import VectorBackend, VectorMatch
+
+# Bounds how many blocking query pipelines run on worker threads at once.
+_query_slots = asyncio.Semaphore(QUERY_CONCURRENCY)
+
+# Rooms known to be fully ingested. That is final (a completed room is never ingested again),
+# so it is remembered for the life of the process.
+_ingested_rooms: set[str] = set()
+
+@dataclass
+class IngestProgress:
+    chunk_count: int = 0  # chunks produced so far; the document's total once ingestion finishes
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+
+async def _run_ingest_pipeline(
+    backend: VectorBackend,
+    room_id: str,
+    chunks: Iterator[Chunk],
+    stored_embeddings,
+    writer,
+    progress: IngestProgress,
+    start_chunk: int = 0,
+    on_batches_committed: Optional[Callable[[int], Awaitable[None]]] = None
+) -> None:
+    """
+    Streams chunks through embed -> upsert stages connected by bounded queues, so only a
+    few batches of vectors are alive at a time and embedding overlaps with upserting.
+    Chunks are pulled from `chunks` as the queue drains, so page extraction overlaps too.
+
+    Batches are INGEST_EMBED_BATCH_SIZE chunks, numbered from the start of the document.
+    Ingestion begins at start_chunk (a batch boundary), and on_batches_committed is called
+    whenever the run of fully upserted leading batches grows.
+    """
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    # Batches finish out of order; only a contiguous prefix counts as committed.
+    committed = start_chunk // INGEST_EMBED_BATCH_SIZE
+    reported = committed
+    finished_batches: set[int] = set()
+    report_lock = asyncio.Lock()
+    # Upserts handed to worker threads; they can't be cancelled, only waited for.
+    inflight: set[asyncio.Future] = set()
+
+    def next_batch() -> list[Chunk]:
+        with timed("extract_and_split"):
+            return list(itertools.islice(chunks, INGEST_EMBED_BATCH_SIZE))
+
+    def embed_batch(start: int, batch: list[Chunk]):
+        # Vectors stay a float32 matrix (or a view of the stored one) until the backend serializes them.
+        if stored_embeddings is not None and start + len(batch) <= len(stored_embeddings):
+            return stored_embeddings[start:start + len(batch)]
+        with timed("embed_batch", items=len(batch)):
+            vectors = embed_texts("passage", [chunk.text for chunk in batch])
+        if writer is not None:
+            writer.write(start, vectors)
+        return vectors
+
+    def upsert_batch(start: int, batch: list[Chunk], vectors):
+        # The backend splits the batch into requests it can send.
+        with timed("vector_upsert", items=len(batch)):
+            backend.upsert(
+                room_id,
+                ids=[f'{room_id}-{start + i}' for i in range(len(batch))],
+                vectors=vectors,
+                metadatas=[
+                    {'original_text': chunk.text, 'page_start': chunk.page_start, 'page_end': chunk.page_end}
+                    for chunk in batch
+                ]
+            )
+        log(f"Upserted chunks {start}-{start + len(batch) - 1} for room {room_id}")
+
+    async def produce():
+        start = 0
+        while batch := await run_in_threadpool(next_batch):
+            # Batches before start_chunk were upserted by an earlier run; they are still
+            # produced (the chunker is sequential) but not embedded again.
+            if start >= start_chunk:
+                await embed_queue.put((start, batch))
+            start += len(batch)
+            progress.chunk_count = start
+        for _ in range(INGEST_EMBED_WORKERS):
+            await embed_queue.put(None)
+
+    async def embed_worker():
+        while (item := await embed_queue.get()) is not None:
+            start, batch = item
+            vectors = await run_in_threadpool(embed_batch, start, batch)
+            progress.chunks_embedded += len(batch)
+            await upsert_queue.put((start, batch, vectors))
 
-    if existing_vectors['matches']:
+    async def embed_stage():
+        await asyncio.gather(*(embed_worker() for _ in range(INGEST_EMBED_WORKERS)))
+        for _ in range(INGEST_UPSERT_WORKERS):
+            await upsert_queue.put(None)
+
+    async def upsert_worker():
+        nonlocal committed, reported
+        while (item := await upsert_queue.get()) is not None:
+            await _raise_if_deleted(room_id)
+            call = asyncio.ensure_future(run_in_threadpool(upsert_batch, *item))
+            inflight.add(call)
+            call.add_done_callback(inflight.discard)
+            await asyncio.shield(call)
+            progress.chunks_upserted += len(item[1])
+
+            finished_batches.add(item[0] // INGEST_EMBED_BATCH_SIZE)
+            while committed in finished_batches:
+                finished_batches.discard(committed)
+                committed += 1
+            if on_batches_committed is not None:
+                async with report_lock:
+                    if committed > reported:
+                        reported = committed
+                        await on_batches_committed(committed)
+
+    tasks = [
+        asyncio.ensure_future(produce()),
+        asyncio.ensure_future(embed_stage()),
+        *(asyncio.ensure_future(upsert_worker()) for _ in range(INGEST_UPSERT_WORKERS)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # A failed stage would leave the others blocked on its queue.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Once this returns, the room may be reaped: no upsert may still be running.
+        await asyncio.gather(*inflight, return_exceptions=True)
+        raise
+
+async def _raise_if_deleted(room_id: str):
+    """
+    Stops ingesting a room that was deleted meanwhile, possibly through another worker. The room
+    row goes with the tombstone and never comes back, so this holds after reaping too.
+    """
+    async with AsyncSessionLocal() as db:
+        if await db.get(Room, int(room_id)) is None:
+            raise HTTPException(status_code=410, detail=f"Room '{room_id}' was deleted.")
+
+async def upsert_pages_to_pinecone(
+    room_id: str,
+    pages: Iterable[str],
+    db: AsyncSession,
+    content_hash: str,
+    progress: Optional[IngestProgress] = None
+) -> int:
+    """
+    Chunks, embeds and stores a room's PDF pages as they are read, tracking batch progress in
+    its ingestion manifest. A previously interrupted run for the same PDF resumes after its
+    last committed batch. Returns the number of chunks.
+    """
+    manifest = await manifest_service.get_manifest(db, int(room_id))
+    if manifest is None:
+        raise HTTPException(status_code=404, detail=f"No ingestion manifest for room '{room_id}'.")
+    if manifest.status == "completed":
         raise HTTPException(
             status_code=409,
             detail=f"ID '{room_id}'는 이미 존재합니다. 다른 제목을 사용해주세요."
         )
 
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
-
-    chunks = text_splitter.split_text(text)
-    embeddings_list = embeddings.embed_documents(chunks)
-
-    vectors_to_upsert = []
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings_list)):
-        vector_id = f'{room_id}-{i}'
-        vectors_to_upsert.append({
-            'id': vector_id,
-            'values': embedding,
-            'metadata': {'original_text': chunk, 'room_id': room_id}
-        })
-
-    batch_size = 100
-    print(f"Upserting {len(vectors_to_upsert)} vectors in batches of {batch_size}...")
-    for i in range(0, len(vectors_to_upsert), batch_size):
-        batch = vectors_to_upsert[i:i + batch_size]
-        print(f"Upserting batch {i // batch_size + 1}...")
-        index.upsert(vectors=batch)
-    
-    return len(chunks)
-
-def delete_vectors_by_room_id(room_id: str):
-    index = get_pinecone_index()
-    index.delete(filter={'room_id': room_id})
-    print(f"Deleted vectors for room_id: {room_id}")
-
-def query_from_pinecone(room_id: str, question: str) -> str:
-    vectorstore = PineconeVectorStore(
-        index_name=PINECONE_INDEX_NAME,
-        embedding=embeddings,
-        text_key='original_text'
-    )
+    await _raise_if_deleted(room_id)
 
-    retriever = vectorstore.as_retriever(
-        search_kwargs={'filter': {'room_id': room_id}}
-    )
+    answer_cache.invalidate_room(room_id)
+    backend = await run_in_threadpool(get_vector_backend)
+
+    start_chunk = manifest_service.resume_chunk_index(manifest, content_hash)
+    if progress is None:
+        progress = IngestProgress()
+    progress.chunk_count = progress.chunks_embedded = progress.chunks_upserted = start_chunk
+
+    # The same PDF uploaded again produces the same chunks, so its stored vectors can be reused.
+    stored_embeddings = load_embeddings(content_hash)
+    # A resumed run only embeds the tail, which isn't enough to store the whole matrix.
+    writer = open_embedding_writer(content_hash) if stored_embeddings is None and start_chunk == 0 else None
+
+    async def on_batches_committed(batches: int):
+        manifest_service.record_chunks_produced(manifest, progress.chunk_count)
+        await manifest_service.record_batches_committed(db, manifest, batches)
+
+    await manifest_service.mark_ingesting(db, manifest, start_chunk)
+    log(f"Ingesting room {room_id} from chunk {start_chunk} (embed batch {INGEST_EMBED_BATCH_SIZE})...")
+    try:
+        await _run_ingest_pipeline(
+            backend, room_id, iter_chunks(pages), stored_embeddings, writer, progress,
+            start_chunk=start_chunk,
+            on_batches_committed=on_batches_committed
+        )
+        if progress.chunk_count == 0:
+            raise HTTPException(status_code=400, detail="Could not extract text from the PDF.")
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+    if writer is not None:
+        writer.commit()
+
+    manifest_service.record_chunks_produced(manifest, progress.chunk_count)
+    await manifest_service.mark_finished(db, manifest)
+    # Nothing should have been cached meanwhile (see _is_room_ingested); this is a safety net.
+    answer_cache.invalidate_room(room_id)
+    return progress.chunk_count
+
+def delete_vectors_by_room_id(room_id: str, chunk_count: Optional[int]):
+    """
+    Deletes a room's vectors. Their ids, `{room_id}-0` .. `{room_id}-{chunk_count - 1}`, are passed
+    along for backends that can't drop a room in one call; chunk_count is None when they are unknown.
+    """
+    vector_ids = None if chunk_count is None else [f'{room_id}-{i}' for i in range(chunk_count)]
+    get_vector_backend().delete_room(room_id, vector_ids)
+    answer_cache.invalidate_room(room_id)
+    log(f"Deleted vectors for room_id: {room_id}")
+
+def _embed_query(question: str) -> list[float]:
+    with timed("query_embed"):
+        return embed_texts("query", [question])[0]
+
+def _retrieve(room_id: str, question_embedding: list[float]) -> list[VectorMatch]:
+    with timed("retrieval"):
+        return get_vector_backend().query(room_id, question_embedding, RETRIEVAL_TOP_K)
+
+def _build_prompt(question: str, matches: list[VectorMatch]):
+    # Same prompt as the "stuff" chain, but with neighbouring chunks merged, their shared
+    # overlap removed, and the context capped at CONTEXT_TOKEN_BUDGET.
+    return get_qa_prompt().format_prompt(context=pack_context(matches), question=question)
+
+def _embed_queries(questions: list[str]) -> list[list[float]]:
+    with timed("query_embed", items=len(questions)):
+        return embed_texts("query", questions)
+
+async def _is_room_ingested(room_id: str) -> bool:
+    """
+    Whether answers for the room may use the answer cache. Questions can arrive while the room
+    is still being ingested; their answers come from partial context and must not be served
+    again once the whole PDF is in. Rooms without a manifest predate background ingestion.
+    """
+    if room_id in _ingested_rooms:
+        return True
+    async with AsyncSessionLocal() as db:
+        manifest = await manifest_service.get_manifest(db, int(room_id))
+    if manifest is not None and manifest.status != "completed":
+        return False
+    _ingested_rooms.add(room_id)
+    return True
+
+def _answer(room_id: str, question: str, question_embedding: list[float], use_cache: bool = True) -> str:
+    if use_cache:
+        cached_answer = answer_cache.lookup(room_id, question_embedding)
+        if cached_answer is not None:
+            return cached_answer
+
+    matches = _retrieve(room_id, question_embedding)
+    with timed("llm_generate"):
+        answer = get_llm().invoke(_build_prompt(question, matches)).content
+
+    if use_cache:
+        answer_cache.store(room_id, question_embedding, answer)
+    return answer
+
+def query_from_pinecone(room_id: str, question: str, use_cache: bool = True) -> str:
+    # Embed once up front: the vector is both the answer-cache key and the search query.
+    return _answer(room_id, question, _embed_query(question), use_cache)
 
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever
+async def aquery_batch_from_pinecone(room_id: str, questions: list[str]) -> list[Union[str, Exception]]:
+    """
+    Answers several questions about one room: one embedding call for all of them, then
+    retrieval and generation for up to BATCH_QUERY_CONCURRENCY questions at a time.
+    Returns the answers in order, with the exception in place of any question that failed.
+    """
+    use_cache = await _is_room_ingested(room_id)
+    async with _query_slots:
+        question_embeddings = await run_in_threadpool(_embed_queries, questions)
+
+    batch_slots = asyncio.Semaphore(BATCH_QUERY_CONCURRENCY)
+
+    async def answer(question: str, question_embedding: list[float]) -> str:
+        async def run() -> str:
+            async with batch_slots, _query_slots:
+                return await run_in_threadpool(_answer, room_id, question, question_embedding, use_cache)
+
+        # Repeated questions in the batch (or in concurrent requests) are answered once.
+        return await single_flight.run_once("answer", _question_key(room_id, question), run)
+
+    return await asyncio.gather(
+        *(answer(q, e) for q, e in zip(questions, question_embeddings)),
+        return_exceptions=True
     )
 
-    result = qa_chain.invoke(question)
-    return result['result']
+def _question_key(room_id: str, question: str) -> tuple[str, str]:
+    # Questions differing only in case or spacing get the same answer.
+    return room_id, " ".join(question.casefold().split())
+
+async def aquery_from_pinecone(room_id: str, question: str) -> str:
+    """
+    Runs query_from_pinecone off the event loop so a slow embedding, Pinecone
+    or Gemini call doesn't stall other requests on the worker. Identical questions
+    arriving while one is being answered share its result.
+    """
+    async def run() -> str:
+        use_cache = await _is_room_ingested(room_id)
+        async with _query_slots:
+            return await run_in_threadpool(query_from_pinecone, room_id, question, use_cache)
+
+    return await single_flight.run_once("answer", _question_key(room_id, question), run)
+
+async def astream_query_from_pinecone(room_id: str, question: str) -> AsyncIterator[str]:
+    """
+    Same pipeline as query_from_pinecone, but yields the answer piece by piece as Gemini
+    generates it. A cached answer is yielded whole.
+    """
+    use_cache = await _is_room_ingested(room_id)
+    async with _query_slots:
+        question_embedding = await run_in_threadpool(_embed_query, question)
+
+        if use_cache:
+            cached_answer = answer_cache.lookup(room_id, question_embedding)
+            if cached_answer is not None:
+                yield cached_answer
+                return
+
+        matches = await run_in_threadpool(_retrieve, room_id, question_embedding)
+        # The first get_llm() builds the client and the prompt template is formatted in Python;
+        # neither should stall the event loop.
+        llm = await run_in_threadpool(get_llm)
+        prompt = await run_in_threadpool(_build_prompt, question, matches)
+
+        parts = []
+        started = time.perf_counter()
+        with timed("llm_generate"):
+            async for chunk in llm.astream(prompt):
+                if chunk.content:
+                    if not parts:
+                        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                    parts.append(chunk.content)
+                    yield chunk.content
+
+        if use_cache:
+            answer_cache.store(room_id, question_embedding, "".join(parts))
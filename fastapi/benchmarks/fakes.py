@@ -0,0 +1,63 @@
+"""Local stand-ins for the Upstage embedding and Gemini chat clients, with configurable latency."""
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+class FakeEmbeddings:
+    """
+    Deterministic unit vectors derived from a hash of the text, so the same chunk or question
+    always embeds the same way. Each call blocks for `latency` seconds plus `latency_per_text`
+    per input, like a remote embedding API called from a worker thread.
+    """
+
+    def __init__(self, dimension: int, latency: float = 0.0, latency_per_text: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.random.default_rng(_seed(text)).standard_normal(self.dimension, dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency + self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency + self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+class FakeChatModel:
+    """
+    Answers every prompt with `answer_tokens` words after `latency` seconds. Streaming spreads
+    the same latency over the tokens, so time-to-first-token is latency / answer_tokens.
+    """
+
+    def __init__(self, latency: float = 0.0, answer_tokens: int = 50):
+        self.latency = latency
+        self.answer_tokens = max(answer_tokens, 1)
+
+    def _tokens(self, prompt) -> list[str]:
+        rng = np.random.default_rng(_seed(str(prompt)))
+        return [f"word{i} " for i in rng.integers(0, 5000, self.answer_tokens)]
+
+    def invoke(self, prompt) -> AIMessage:
+        time.sleep(self.latency)
+        return AIMessage(content="".join(self._tokens(prompt)))
+
+    async def astream(self, prompt):
+        delay = self.latency / self.answer_tokens
+        for token in self._tokens(prompt):
+            await asyncio.sleep(delay)
+            yield AIMessageChunk(content=token)
@@ -0,0 +1,243 @@
+"""
+Offline benchmark: drives the API in-process with local stand-ins for every external service.
+
+    pip install -r requirements.txt -r benchmarks/requirements.txt
+    python -m benchmarks.run --pdfs 20 --queries 200 --concurrency 8 --embed-latency-ms 50 --llm-latency-ms 300
+
+Upstage and Gemini are replaced by benchmarks.fakes, Pinecone by the local vector backend,
+MongoDB by mongomock-motor and MySQL by SQLite (aiosqlite), all under a throwaway working
+directory. The run uploads a generated PDF corpus through /upsert-pdf/ and waits for the
+ingest jobs, then sends /query-pdf/ and GET /rooms/{id}/messages requests, and reports
+throughput, p50/p95/p99 latency per phase and the peak RSS of the process.
+
+Requests are sent through httpx's ASGI transport, so client and server share one event loop;
+numbers are for comparing builds against each other, not for capacity planning.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+@dataclass
+class PhaseResult:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    latencies_ms: list[float] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        latencies = np.asarray(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            "phase": self.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throughput_rps": self.requests / self.seconds if self.seconds else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--pdfs", type=int, default=10, help="number of PDFs to upload")
+    parser.add_argument("--pages", type=int, default=20, help="pages per generated PDF")
+    parser.add_argument("--queries", type=int, default=100, help="number of /query-pdf/ requests")
+    parser.add_argument("--history-reads", type=int, default=100, help="number of message history requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per phase")
+    parser.add_argument("--users", type=int, default=4, help="PDFs are spread over this many user ids")
+    parser.add_argument("--dimension", type=int, default=4096, help="embedding dimension")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="latency per embedding call")
+    parser.add_argument("--embed-latency-per-text-ms", type=float, default=0.0, help="extra latency per embedded text")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="latency per answer")
+    parser.add_argument("--answer-tokens", type=int, default=50, help="tokens per fake answer")
+    parser.add_argument("--no-answer-cache", action="store_true", help="disable the semantic answer cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the run's files here instead of a temporary directory")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    return parser.parse_args()
+
+def _configure_environment(args, workdir: str):
+    # Must happen before anything under app/ is imported: config is read at import time.
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "DB_NAME": "bench",
+        "DB_SCHEMA_CHECK": "always",
+        "WARMUP_MODE": "off",
+        "SQL_ECHO": "false",
+        "VECTOR_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": os.path.join(workdir, "vector_index"),
+        "EMBEDDING_DIMENSION": str(args.dimension),
+        "ANSWER_CACHE_ENABLED": "false" if args.no_answer_cache else os.getenv("ANSWER_CACHE_ENABLED", "true"),
+    })
+    # Relative paths in the app (uploads, text cache, schema marker) land in the working directory.
+    os.chdir(workdir)
+
+_VOCABULARY = [f"{a}{b}{c}" for a in "bcdfgklmnprst" for b in "aeiou" for c in ("n", "r", "s", "l", "ta", "ko")]
+
+def _make_pdf(rng: np.random.Generator, pages: int) -> bytes:
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        words = rng.choice(_VOCABULARY, size=450)
+        page.insert_textbox(page.rect + (36, 36, -36, -36), " ".join(words), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _question(rng: np.random.Generator) -> str:
+    return " ".join(rng.choice(_VOCABULARY, size=8)) + "?"
+
+async def _run_phase(name: str, count: int, concurrency: int, request) -> PhaseResult:
+    """Calls `request(i, result)` for i in range(count) with `concurrency` calls in flight."""
+    result = PhaseResult(name=name)
+    indices = iter(range(count))
+
+    async def worker():
+        for i in indices:
+            started = time.perf_counter()
+            try:
+                await request(i, result)
+                result.latencies_ms.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                result.errors += 1
+                print(f"{name} #{i} failed: {e}")
+            result.requests += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.seconds = time.perf_counter() - started
+    return result
+
+async def _benchmark(args) -> list[PhaseResult]:
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    from app.main import app
+    from app.core import dependencies
+    from app.core.resources import resources
+    from benchmarks.fakes import FakeEmbeddings, FakeChatModel
+
+    resources.override(
+        embeddings=FakeEmbeddings(args.dimension, args.embed_latency_ms / 1000, args.embed_latency_per_text_ms / 1000),
+        llm=FakeChatModel(args.llm_latency_ms / 1000, args.answer_tokens),
+    )
+    dependencies._mongo_client = AsyncMongoMockClient()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"Generating {args.pdfs} PDFs of {args.pages} pages...")
+    corpus = [_make_pdf(rng, args.pages) for _ in range(args.pdfs)]
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            jobs: dict[int, tuple[str, float]] = {}
+
+            async def upload(i: int, result: PhaseResult):
+                while True:
+                    response = await client.post(
+                        "/api/v1/upsert-pdf/",
+                        data={"title": f"bench {i}", "user_id": str(i % args.users)},
+                        files={"file": (f"bench-{i}.pdf", corpus[i], "application/pdf")},
+                    )
+                    if response.status_code != 503:
+                        break
+                    # Ingest queue full; the service asks us to come back later.
+                    result.retries += 1
+                    await asyncio.sleep(0.05)
+                response.raise_for_status()
+                jobs[i] = (response.json()["job_id"], time.perf_counter())
+
+            results.append(await _run_phase("upload", args.pdfs, args.concurrency, upload))
+
+            ingest = PhaseResult(name="ingest (upload accepted -> job done)")
+            started = time.perf_counter()
+            room_ids = []
+            pending = dict(jobs)
+            while pending:
+                for i, (job_id, accepted_at) in list(pending.items()):
+                    status = (await client.get(f"/api/v1/ingest-jobs/{job_id}")).json()
+                    if status["stage"] in ("completed", "failed"):
+                        del pending[i]
+                        ingest.requests += 1
+                        if status["stage"] == "failed":
+                            ingest.errors += 1
+                            print(f"Ingest of PDF #{i} failed: {status['error']}")
+                            continue
+                        ingest.latencies_ms.append((time.perf_counter() - accepted_at) * 1000)
+                        room_ids.append(status["room_id"])
+                await asyncio.sleep(0.02)
+            ingest.seconds = time.perf_counter() - started
+            results.append(ingest)
+
+            if not room_ids:
+                print("No PDF was ingested; skipping the query phases.")
+                return results
+
+            async def query(i: int, result: PhaseResult):
+                response = await client.post(
+                    "/api/v1/query-pdf/",
+                    data={"room_id": str(room_ids[i % len(room_ids)]), "question": _question(rng)},
+                )
+                response.raise_for_status()
+
+            results.append(await _run_phase("query", args.queries, args.concurrency, query))
+
+            async def history(i: int, result: PhaseResult):
+                response = await client.get(f"/api/v1/rooms/{room_ids[i % len(room_ids)]}/messages", params={"limit": 50})
+                response.raise_for_status()
+
+            results.append(await _run_phase("history", args.history_reads, args.concurrency, history))
+    return results
+
+def _report(results: list[PhaseResult], args) -> dict:
+    # ru_maxrss is in KiB on Linux.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    summaries = [result.summary() for result in results]
+
+    print()
+    print(f"{'phase':<40} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for s in summaries:
+        print(f"{s['phase']:<40} {s['requests']:>6} {s['errors']:>6} {s['throughput_rps']:>9.1f} "
+              f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+    print(f"peak RSS: {peak_rss_mb:.0f} MB")
+    return {"config": vars(args), "phases": summaries, "peak_rss_mb": peak_rss_mb}
+
+def main():
+    args = _parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pdf-qa-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    workdir = os.path.abspath(workdir)
+    cwd = os.getcwd()
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    _configure_environment(args, workdir)
+    try:
+        results = asyncio.run(_benchmark(args))
+        report = _report(results, args)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Moves vectors stored before per-room namespaces into their room's namespace.
+
+    python -m scripts.migrate_pinecone_namespaces --dry-run
+    python -m scripts.migrate_pinecone_namespaces --batch-size 100
+
+Ids in the default namespace of the Pinecone index are listed a page at a time. Each page is
+fetched, upserted into the namespace of the room named in its `room_id` metadata, and only
+then deleted from the default namespace. Pagination tokens are opaque and may not survive
+those deletes, so listing starts over after every page that moved something. Copying is
+idempotent, so an interrupted run can simply be started again; running it again also picks
+up vectors that Pinecone's eventually consistent listing missed. Vectors without a room_id
+are left where they are.
+
+Once a run finds nothing left to move, set PINECONE_LEGACY_FILTER_FALLBACK=false so queries
+and deletes stop looking in the default namespace.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+_DEFAULT_NAMESPACE = ""
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--batch-size", type=int, default=100, help="vectors listed and moved per step (at most 100)")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be moved")
+    return parser.parse_args()
+
+def migrate(index, backend, batch_size: int, dry_run: bool = False) -> dict:
+    """Moves every room-tagged vector out of the default namespace; returns counts."""
+    moved = 0
+    skipped = set()  # counted once, though a restarted listing sees them again
+    rooms = set()
+    token = None
+    while True:
+        page = index.list_paginated(namespace=_DEFAULT_NAMESPACE, limit=batch_size, pagination_token=token)
+        ids = [item.id for item in page.vectors]
+        deleted = False
+        if ids:
+            fetched = index.fetch(ids=ids, namespace=_DEFAULT_NAMESPACE).vectors
+            by_room: dict[str, list] = {}
+            for vector_id in ids:
+                vector = fetched.get(vector_id)
+                if vector is None:
+                    # Deleted since it was listed.
+                    continue
+                room_id = (vector.metadata or {}).get("room_id")
+                if room_id is None:
+                    skipped.add(vector_id)
+                    continue
+                by_room.setdefault(str(room_id), []).append(vector)
+
+            for room_id, vectors in by_room.items():
+                room_ids = [vector.id for vector in vectors]
+                if not dry_run:
+                    backend.upsert(
+                        room_id,
+                        ids=room_ids,
+                        vectors=[vector.values for vector in vectors],
+                        # The backend adds room_id back.
+                        metadatas=[
+                            {key: value for key, value in vector.metadata.items() if key != "room_id"}
+                            for vector in vectors
+                        ]
+                    )
+                    index.delete(ids=room_ids, namespace=_DEFAULT_NAMESPACE)
+                    deleted = True
+                moved += len(vectors)
+                rooms.add(room_id)
+            print(f"{'Would move' if dry_run else 'Moved'} {moved} vectors of {len(rooms)} rooms so far...")
+
+        if deleted:
+            token = None
+            continue
+        token = page.pagination.next if page.pagination else None
+        if not token:
+            break
+    return {"moved": moved, "rooms": len(rooms), "skipped": len(skipped)}
+
+def main():
+    args = _parse_args()
+
+    from app.core.config import VECTOR_BACKEND
+    from app.core.dependencies import get_pinecone_index, get_vector_backend
+    from app.services.vector_backends import PineconeVectorBackend
+
+    backend = get_vector_backend()
+    if not isinstance(backend, PineconeVectorBackend):
+        sys.exit(f"VECTOR_BACKEND is '{VECTOR_BACKEND}'; there is nothing to migrate.")
+
+    started = time.perf_counter()
+    counts = migrate(get_pinecone_index(), backend, min(args.batch_size, 100), dry_run=args.dry_run)
+    print(f"{'Would move' if args.dry_run else 'Moved'} {counts['moved']} vectors into {counts['rooms']} room namespaces "
+          f"in {time.perf_counter() - started:.1f}s; left {counts['skipped']} vectors without a room_id.")
+
+if __name__ == "__main__":
+    main()
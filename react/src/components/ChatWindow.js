@@ -2,11 +2,17 @@
 import React, { useState, useEffect, useRef } from 'react';
 import './ChatWindow.css';
 
+const PAGE_SIZE = 50;
+
 const ChatWindow = ({ room }) => {
     const [messages, setMessages] = useState([]);
     const [newMessage, setNewMessage] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    const [hasOlderMessages, setHasOlderMessages] = useState(false);
+    const [isLoadingOlder, setIsLoadingOlder] = useState(false);
     const messagesEndRef = useRef(null);
+    const messagesListRef = useRef(null);
+    const skipAutoScrollRef = useRef(false);
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -14,22 +20,69 @@ const ChatWindow = ({ room }) => {
 
     useEffect(() => {
         if (room) {
-            fetch(`/api/v1/rooms/${room.room_id}/messages`)
+            // Only the most recent page; older pages are fetched when scrolling to the top.
+            fetch(`/api/v1/rooms/${room.room_id}/messages?limit=${PAGE_SIZE}`)
                 .then(response => response.json())
-                .then(data => setMessages(Array.isArray(data) ? data : []))
+                .then(data => {
+                    const page = Array.isArray(data) ? data : [];
+                    setMessages(page);
+                    setHasOlderMessages(page.length === PAGE_SIZE);
+                })
                 .catch(error => {
                     console.error('Error fetching messages:', error);
                     setMessages([]); // Set to empty array on error
+                    setHasOlderMessages(false);
                 });
         } else {
             setMessages([]);
+            setHasOlderMessages(false);
         }
     }, [room]);
 
     useEffect(() => {
+        if (skipAutoScrollRef.current) {
+            skipAutoScrollRef.current = false;
+            return;
+        }
         scrollToBottom();
     }, [messages]);
 
+    const loadOlderMessages = async () => {
+        if (!room || !hasOlderMessages || isLoadingOlder) return;
+        const oldestMessage = messages.find(msg => msg.sequence_number !== undefined);
+        if (!oldestMessage) return;
+
+        const list = messagesListRef.current;
+        const previousScrollHeight = list.scrollHeight;
+        setIsLoadingOlder(true);
+
+        try {
+            const response = await fetch(
+                `/api/v1/rooms/${room.room_id}/messages?limit=${PAGE_SIZE}&before=${oldestMessage.sequence_number}`
+            );
+            const data = await response.json();
+            const page = Array.isArray(data) ? data : [];
+
+            skipAutoScrollRef.current = true;
+            setMessages(prevMessages => [...page, ...prevMessages]);
+            setHasOlderMessages(page.length === PAGE_SIZE);
+            // Keep the message that was at the top in view instead of jumping.
+            requestAnimationFrame(() => {
+                list.scrollTop = list.scrollHeight - previousScrollHeight;
+            });
+        } catch (error) {
+            console.error('Error fetching older messages:', error);
+        } finally {
+            setIsLoadingOlder(false);
+        }
+    };
+
+    const handleScroll = (e) => {
+        if (e.currentTarget.scrollTop === 0) {
+            loadOlderMessages();
+        }
+    };
+
     const handleSendMessage = async (e) => {
         e.preventDefault();
         if (newMessage.trim() === '' || !room || isLoading) return;
@@ -49,26 +102,61 @@ const ChatWindow = ({ room }) => {
         formData.append('room_id', room.room_id);
         formData.append('question', userMessage.content);
 
+        const systemMessageId = `system-${Date.now()}`;
+        const appendToSystemMessage = (text) => {
+            setMessages(prevMessages => {
+                if (!prevMessages.some(msg => msg.id === systemMessageId)) {
+                    return [...prevMessages, { id: systemMessageId, sender: 'system', content: text, room_id: room.room_id }];
+                }
+                return prevMessages.map(msg =>
+                    msg.id === systemMessageId ? { ...msg, content: msg.content + text } : msg
+                );
+            });
+        };
+
         try {
-            const response = await fetch('/api/v1/query-pdf/', {
+            // The answer arrives as Server-Sent Events: one `data: {"token": ...}` per piece,
+            // then an `event: done` (or `event: error`) once the full answer is saved.
+            const response = await fetch('/api/v1/query-pdf/stream', {
                 method: 'POST',
                 body: formData,
             });
 
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error('Network response was not ok');
             }
 
-            const data = await response.json();
-
-            const systemMessage = {
-                id: `system-${Date.now()}`,
-                sender: 'system',
-                content: data.answer,
-                room_id: room.room_id
-            };
-            
-            setMessages(prevMessages => [...prevMessages, systemMessage]);
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    let eventName = 'message';
+                    let data = '';
+                    rawEvent.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) eventName = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    if (!data) continue;
+
+                    const payload = JSON.parse(data);
+                    if (eventName === 'error') {
+                        throw new Error(payload.detail);
+                    }
+                    if (eventName === 'message') {
+                        appendToSystemMessage(payload.token);
+                    }
+                }
+            }
 
         } catch (error) {
             console.error('Error sending message:', error);
@@ -90,14 +178,14 @@ const ChatWindow = ({ room }) => {
 
     return (
         <div className="chat-window">
-            <div className="messages-list">
+            <div className="messages-list" ref={messagesListRef} onScroll={handleScroll}>
                 {messages.map((msg) => (
                     <div key={msg.id || msg.sequence_number} className={`message ${msg.sender === 'user' ? 'sent' : 'received'}`}>
                         <div className="message-sender">{msg.sender}</div>
                         <div className="message-content">{msg.content}</div>
                     </div>
                 ))}
-                {isLoading && (
+                {isLoading && messages[messages.length - 1]?.sender !== 'system' && (
                     <div className="message received">
                         <div className="message-sender">system</div>
                         <div className="message-content typing-indicator">...</div>
@@ -46,7 +46,7 @@ const NewRoomModal = ({ user, onRoomCreate, onClose }) => {
             }
 
             const newRoomData = await response.json();
-            // The API returns { message, base_id, chunk_count }
+            // The API returns { message, base_id, job_id } and keeps ingesting the PDF in the background
             // We need to create a room object that matches what the sidebar expects: { room_id, title }
             const newRoom = { room_id: parseInt(newRoomData.base_id), title: title };
 